@@ -1,13 +1,17 @@
 import logging
-from time import sleep
 
 from _db import database
+from base import film_hashes
 from settings import CONFIG
 
 logging.basicConfig(format="%(asctime)s %(levelname)s:%(message)s", level=logging.INFO)
 
 
 def delete_with(post_ids):
+    if post_ids:
+        # Otherwise the crawlers would skip the deleted films as unchanged
+        film_hashes.clear()
+
     for post_id in post_ids:
         logging.info("Deleting post: {0}".format(post_id))
 
@@ -52,7 +56,6 @@ WHERE p.ID={post_id} AND p.ID=tr.object_id AND tr.term_taxonomy_id=tt.term_taxon
             table=f"{CONFIG.TABLE_PREFIX}posts",
             condition=f'ID="{post_id}"',
         )
-        sleep(0.1)
 
 
 def main():
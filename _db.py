@@ -1,81 +1,339 @@
-import sys
+import logging
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
 
 import mysql.connector
+from mysql.connector import errors
 from mysql.connector.pooling import MySQLConnectionPool
 
 from settings import CONFIG
 
+DB_POOL_SIZE = getattr(CONFIG, "DB_POOL_SIZE", 5)
+DB_POOL_CHECKOUT_ATTEMPTS = getattr(CONFIG, "DB_POOL_CHECKOUT_ATTEMPTS", 20)
+DB_POOL_CHECKOUT_WAIT = getattr(CONFIG, "DB_POOL_CHECKOUT_WAIT", 0.25)
+DB_INSERT_CHUNK_SIZE = getattr(CONFIG, "DB_INSERT_CHUNK_SIZE", 500)
+DB_FETCH_SIZE = getattr(CONFIG, "DB_FETCH_SIZE", 10_000)
+
+
+def normalize_stored(value) -> str:
+    # What *_ci collations and trailing space padding do not tell apart
+    value = unicodedata.normalize("NFKD", str(value))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return value.casefold().rstrip()
+
+
+def is_stored_as(stored, value) -> bool:
+    """Whether a column holding `stored` was written from `value`, allowing
+    for collation, trailing space and column length truncation."""
+    if str(stored) == str(value):
+        return True
+
+    stored = normalize_stored(stored)
+    value = normalize_stored(value)
+    return bool(stored) and value.startswith(stored)
+
 
 class Database:
+    def __init__(self, pool_size: int = 0):
+        # pool_size=0 keeps the historical one-connection-per-call behaviour
+        self.pool_size = pool_size
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # Per-thread connection of the open transaction(), if any
+        self.local = threading.local()
+        self.barriers = []
+        self.max_allowed_packet = 0
+        # (innodb_autoinc_lock_mode, auto_increment_increment)
+        self.autoinc_settings = None
+
+    def get_conn_params(self) -> dict:
+        return {
+            "user": CONFIG.user,
+            "password": CONFIG.password,
+            "host": CONFIG.host,
+            "port": CONFIG.port,
+            "database": CONFIG.database,
+        }
+
+    def use_pool(self, pool_size: int = DB_POOL_SIZE):
+        """Switch to pooled connections, for the long-running crawl loops."""
+        with self.pool_lock:
+            self.pool_size = pool_size
+            self.pool = None
+
+    def get_pool(self) -> MySQLConnectionPool:
+        with self.pool_lock:
+            if self.pool is None:
+                # Pooled connections outlive a single call, so they run in
+                # autocommit mode: a bare SELECT must not pin a stale snapshot
+                # for the next borrower.
+                self.pool = MySQLConnectionPool(
+                    pool_name="dootheme",
+                    pool_size=self.pool_size,
+                    pool_reset_session=False,
+                    autocommit=True,
+                    **self.get_conn_params(),
+                )
+            return self.pool
+
+    def get_pooled_conn(self):
+        for attempt in range(DB_POOL_CHECKOUT_ATTEMPTS):
+            try:
+                # get_connection() pings the connection and reconnects it
+                # when the server dropped it while it sat idle in the pool.
+                return self.get_pool().get_connection()
+            except errors.PoolError:
+                # Pool exhausted, wait for a connection to be given back
+                time.sleep(DB_POOL_CHECKOUT_WAIT)
+            except errors.InterfaceError as e:
+                logging.warning(f"Reconnecting pooled connection failed: {e}")
+                time.sleep(DB_POOL_CHECKOUT_WAIT * (attempt + 1))
+
+        raise errors.PoolError("No pooled connection available")
+
     def get_conn(self):
+        # Raised, not sys.exit(): in a worker thread SystemExit would kill the
+        # thread silently and leave the crawl hanging on its queue
         try:
-            return mysql.connector.connect(
-                user=CONFIG.user,
-                password=CONFIG.password,
-                host=CONFIG.host,
-                port=CONFIG.port,
-                database=CONFIG.database,
-            )
+            if self.pool_size:
+                return self.get_pooled_conn()
+
+            return mysql.connector.connect(**self.get_conn_params())
         except Exception as e:
-            print(f"Error connecting to MariaDB Platform: {e}")
-            sys.exit(1)
+            logging.error(f"Error connecting to MariaDB Platform: {e}")
+            raise
+
+    @contextmanager
+    def transaction(self):
+        """Run this thread's Database calls on one connection and commit them
+        once, or roll all of them back if the block raises."""
+        if self.get_transaction_conn() is not None:
+            yield
+            return
 
-    def select_with(self, query: str) -> list:
         conn = self.get_conn()
-        cur = conn.cursor()
-        cur.execute(query)
-        res = cur.fetchall()
-        cur.close()
-        conn.close()
+        conn.start_transaction()
+        self.local.conn = conn
+        self.local.commit_hooks = []
+        self.local.rollback_hooks = []
+        try:
+            yield
+            for hook in self.local.commit_hooks:
+                hook()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            for hook in self.local.rollback_hooks:
+                hook()
+            raise
+        finally:
+            self.local.conn = None
+            self.local.commit_hooks = []
+            self.local.rollback_hooks = []
+            conn.close()
 
-        return res
+    def get_transaction_conn(self):
+        return getattr(self.local, "conn", None)
+
+    def on_rollback(self, hook):
+        """Call hook() if the open transaction is rolled back, so in-memory
+        caches can forget rows that never reached the database."""
+        if self.get_transaction_conn() is not None:
+            self.local.rollback_hooks.append(hook)
+
+    def before_commit(self, hook):
+        """Call hook() right before the open transaction commits, still on
+        its connection, so deferred writes become part of it."""
+        if self.get_transaction_conn() is not None:
+            self.local.commit_hooks.append(hook)
+
+    def add_barrier(self, barrier):
+        """Call barrier(query) before every read, update or delete, so
+        write-behind buffers can flush the rows that query could touch."""
+        self.barriers.append(barrier)
+
+    def run_barriers(self, query: str):
+        for barrier in self.barriers:
+            barrier(query)
+
+    @contextmanager
+    def outside_transaction(self):
+        """Run the block on its own connection even if this thread has a
+        transaction open."""
+        conn = self.get_transaction_conn()
+        self.local.conn = None
+        try:
+            yield
+        finally:
+            self.local.conn = conn
+
+    def get_max_allowed_packet(self) -> int:
+        if not self.max_allowed_packet:
+            self.max_allowed_packet = int(
+                self.select_with("SELECT @@max_allowed_packet")[0][0]
+            )
+        return self.max_allowed_packet
+
+    def get_autoinc_settings(self) -> tuple:
+        if self.autoinc_settings is None:
+            lock_mode, increment = self.select_with(
+                "SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment"
+            )[0]
+            self.autoinc_settings = (int(lock_mode), int(increment))
+        return self.autoinc_settings
+
+    @contextmanager
+    def cursor(self, commit: bool = False):
+        conn = self.get_transaction_conn()
+        if conn is not None:
+            # The enclosing transaction() owns commit and close
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+            return
 
-    def select_all_from(self, table: str, condition: str = "1=1", cols: str = "*"):
         conn = self.get_conn()
         cur = conn.cursor()
-        cur.execute(f"SELECT {cols} FROM {table} WHERE {condition}")
-        res = cur.fetchall()
-        cur.close()
-        conn.close()
+        try:
+            yield cur
+            if commit:
+                conn.commit()
+        finally:
+            cur.close()
+            conn.close()
 
-        return res
+    def select_with(self, query: str, data: tuple = ()) -> list:
+        self.run_barriers(query)
+        with self.cursor() as cur:
+            cur.execute(query, data)
+            return cur.fetchall()
+
+    def iter_select(self, query: str, data: tuple = (), size: int = DB_FETCH_SIZE):
+        """Stream the rows of a large result set instead of fetching it whole."""
+        self.run_barriers(query)
+        with self.cursor() as cur:
+            cur.execute(query, data)
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    break
+                yield from rows
+
+    def select_all_from(self, table: str, condition: str = "1=1", cols: str = "*"):
+        query = f"SELECT {cols} FROM {table} WHERE {condition}"
+        self.run_barriers(query)
+        with self.cursor() as cur:
+            cur.execute(query)
+            return cur.fetchall()
 
     def insert_into(self, table: str, data: tuple = None, is_bulk: bool = False):
-        conn = self.get_conn()
-        cur = conn.cursor()
         id = 0
 
         columns = f"({', '.join(CONFIG.INSERT[table])})"
         values = f"({', '.join(['%s'] * len(CONFIG.INSERT[table]))})"
         query = f"INSERT INTO {table} {columns} VALUES {values}"
-        if is_bulk:
-            cur.executemany(query, data)
-        else:
-            cur.execute(query, data)
-            id = cur.lastrowid
+        with self.cursor(commit=True) as cur:
+            if is_bulk:
+                cur.executemany(query, data)
+            else:
+                cur.execute(query, data)
+                id = cur.lastrowid
 
-        conn.commit()
-        cur.close()
-        conn.close()
         return id
 
+    def insert_many(
+        self,
+        table: str,
+        data: list,
+        ignore: bool = False,
+        chunk_size: int = DB_INSERT_CHUNK_SIZE,
+    ) -> list:
+        """Insert rows with multi-row INSERT statements of chunk_size rows.
+
+        Returns the first auto-increment ID of every statement."""
+        columns = f"({', '.join(CONFIG.INSERT[table])})"
+        values = f"({', '.join(['%s'] * len(CONFIG.INSERT[table]))})"
+        ignore = "IGNORE " if ignore else ""
+
+        first_ids = []
+        with self.cursor(commit=True) as cur:
+            for i in range(0, len(data), chunk_size):
+                chunk = data[i : i + chunk_size]
+                query = f"INSERT {ignore}INTO {table} {columns} VALUES " + ", ".join(
+                    [values] * len(chunk)
+                )
+                cur.execute(query, [value for row in chunk for value in row])
+                first_ids.append(cur.lastrowid)
+
+        return first_ids
+
+    def insert_many_with_ids(
+        self, table: str, data: list, id_col: str, check_col: str
+    ) -> list:
+        """insert_many() that also returns the new ID of every row, in order.
+
+        Auto-increment IDs of a multi-row INSERT are consecutive with
+        innodb_autoinc_lock_mode < 2, auto_increment_increment apart (more
+        than 1 on Galera and multi-primary setups). Otherwise the rows from
+        the first ID onwards are read back, and the input rows matched to them
+        in order on check_col, skipping rows other sessions inserted in
+        between."""
+        if not data:
+            return []
+
+        check_index = CONFIG.INSERT[table].index(check_col)
+        lock_mode, increment = self.get_autoinc_settings()
+        is_consecutive = lock_mode < 2
+
+        ids = []
+        for i in range(0, len(data), DB_INSERT_CHUNK_SIZE):
+            chunk = data[i : i + DB_INSERT_CHUNK_SIZE]
+            first_id = self.insert_many(table, chunk)[0]
+            if is_consecutive:
+                ids.extend(
+                    range(first_id, first_id + len(chunk) * increment, increment)
+                )
+                continue
+
+            inserted = self.select_with(
+                f"""SELECT {id_col}, {check_col} FROM {table}
+WHERE {id_col} >= %s ORDER BY {id_col}""",
+                (first_id,),
+            )
+            chunk_ids = []
+            for row_id, check_value in inserted:
+                if len(chunk_ids) == len(chunk):
+                    break
+                if is_stored_as(check_value, chunk[len(chunk_ids)][check_index]):
+                    chunk_ids.append(row_id)
+
+            if len(chunk_ids) != len(chunk):
+                raise errors.DataError(
+                    f"Inserted {len(chunk)} rows into {table} from ID {first_id} "
+                    f"but matched only {len(chunk_ids)} on {check_col} reading "
+                    "them back"
+                )
+            ids.extend(chunk_ids)
+
+        return ids
+
     def update_table(
         self, table: str, set_cond: str, where_cond: str, data: tuple = ()
     ):
-        conn = self.get_conn()
-        cur = conn.cursor()
-        cur.execute(f"UPDATE {table} set {set_cond} WHERE {where_cond}", data)
-        conn.commit()
-        cur.close()
-        conn.close()
+        query = f"UPDATE {table} set {set_cond} WHERE {where_cond}"
+        self.run_barriers(query)
+        with self.cursor(commit=True) as cur:
+            cur.execute(query, data)
 
     def delete_from(self, table: str = "", condition: str = "1=1"):
-        conn = self.get_conn()
-        cur = conn.cursor()
-        cur.execute(f"DELETE FROM {table} WHERE {condition}")
-        conn.commit()
-        cur.close()
-        conn.close()
+        query = f"DELETE FROM {table} WHERE {condition}"
+        self.run_barriers(query)
+        with self.cursor(commit=True) as cur:
+            cur.execute(query)
 
     def select_or_insert(self, table: str, condition: str, data: tuple):
         res = self.select_all_from(table=table, condition=condition)
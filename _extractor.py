@@ -0,0 +1,268 @@
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+# String types Tag.text is made of: no comments, scripts or stylesheets
+TEXT_TYPES = Tag.DEFAULT_INTERESTING_STRING_TYPES
+
+
+class Selector:
+    """A "tag", "tag.class", "tag#id" or "parent > tag" selector."""
+
+    def __init__(self, selector: str):
+        parent, _, selector = selector.rpartition(">")
+        self.parent = Selector(parent) if parent.strip() else None
+
+        selector = selector.strip()
+        self.attr, self.value = None, None
+        for separator, attr in [(".", "class"), ("#", "id")]:
+            if separator in selector:
+                selector, self.value = selector.split(separator, 1)
+                self.attr = attr
+        self.name = selector
+
+    def matches(self, tag: Tag) -> bool:
+        if tag.name != self.name:
+            return False
+        if self.attr == "class" and self.value not in tag.get("class", []):
+            return False
+        if self.attr == "id" and tag.get("id") != self.value:
+            return False
+
+        return self.parent is None or (
+            isinstance(tag.parent, Tag) and self.parent.matches(tag.parent)
+        )
+
+
+class Field:
+    """Declares what to capture below the element of the enclosing field.
+
+    The first descendant matching selector is captured, or all of them with
+    many=True. text=True collects the element's text, leaving out the
+    strings inside its `exclude` sub-field; attr reads one attribute.
+    """
+
+    def __init__(
+        self,
+        selector: str,
+        many: bool = False,
+        text: bool = False,
+        attr: str = None,
+        exclude: str = None,
+        fields: dict = None,
+    ):
+        self.selector = Selector(selector)
+        self.many = many
+        self.text = text
+        self.attr = attr
+        self.exclude = exclude
+        self.fields = fields or {}
+
+
+class Match:
+    def __init__(self, field: Field, element: Tag):
+        self.field = field
+        self.element = element
+        self.is_open = True
+        self.strings = [] if field.text else None
+        self.value = element.get(field.attr) if field.attr else None
+        self.children = {
+            name: [] if child.many else None for name, child in field.fields.items()
+        }
+
+    @property
+    def text(self) -> str:
+        return "".join(self.strings)
+
+    def get(self, name: str):
+        return self.children[name]
+
+    def add_text(self, string: str):
+        excluded = self.field.exclude and self.children[self.field.exclude]
+        if not (excluded and excluded.is_open):
+            self.strings.append(string)
+
+
+class Extractor:
+    """Runs a spec of Fields over a document in a single pass, without
+    modifying it."""
+
+    def __init__(self, fields: dict):
+        self.root = Field("[document]", fields=fields)
+
+    def extract(self, soup: BeautifulSoup) -> Match:
+        root = Match(self.root, soup)
+        open_matches = [root]
+        # Children left to visit and the matches opened by every open element
+        pending = [(iter(soup.contents), [])]
+        while pending:
+            contents, opened = pending[-1]
+            node = next(contents, None)
+            if node is None:
+                pending.pop()
+                for match in opened:
+                    match.is_open = False
+                    open_matches.remove(match)
+                continue
+
+            if isinstance(node, Tag):
+                new_matches = self.enter(node, open_matches)
+                open_matches.extend(new_matches)
+                pending.append((iter(node.contents), new_matches))
+            elif type(node) in TEXT_TYPES:
+                for match in open_matches:
+                    if match.strings is not None:
+                        match.add_text(node)
+
+        root.is_open = False
+        return root
+
+    def enter(self, tag: Tag, open_matches: list) -> list:
+        new_matches = []
+        for match in open_matches:
+            for name, field in match.field.fields.items():
+                captured = match.children[name]
+                if (field.many or captured is None) and field.selector.matches(tag):
+                    new_match = Match(field, tag)
+                    if field.many:
+                        captured.append(new_match)
+                    else:
+                        match.children[name] = new_match
+                    new_matches.append(new_match)
+
+        return new_matches
+
+
+FILM_SPEC = {
+    "fmain": Field(
+        "div.fmain",
+        fields={
+            "description": Field("div.fdesc", text=True),
+            "flist": Field(
+                "div.flist",
+                fields={
+                    "items": Field(
+                        "li",
+                        many=True,
+                        text=True,
+                        fields={"key": Field("span", text=True)},
+                    )
+                },
+            ),
+        },
+    ),
+    "series_center": Field(
+        "div.series-center",
+        fields={
+            "episodes": Field(
+                "div.fullsfeature",
+                many=True,
+                fields={
+                    "title": Field("span", text=True),
+                    "links": Field(
+                        "li",
+                        many=True,
+                        text=True,
+                        fields={"link": Field("a.fsctab", attr="href")},
+                    ),
+                },
+            )
+        },
+    ),
+    "primary_nav_wrap": Field(
+        "nav#primary_nav_wrap",
+        fields={
+            "servers": Field(
+                "ul > li",
+                many=True,
+                text=True,
+                exclude="menu",
+                fields={
+                    "menu": Field(
+                        "ul",
+                        fields={
+                            "links": Field(
+                                "li",
+                                many=True,
+                                text=True,
+                                fields={"link": Field("a", attr="href")},
+                            )
+                        },
+                    )
+                },
+            )
+        },
+    ),
+}
+
+
+class FilmExtractor(Extractor):
+    """Single-pass replacement of helper.get_description_from(),
+    helper.get_extra_info_from() and Crawler.get_film_links()."""
+
+    def __init__(self):
+        super().__init__(FILM_SPEC)
+
+    def get_description(self, page: Match) -> str:
+        fmain = page.get("fmain")
+        if not fmain or not fmain.get("description"):
+            return ""
+
+        return fmain.get("description").text
+
+    def get_extra_info(self, page: Match) -> dict:
+        extra_info = {}
+        fmain = page.get("fmain")
+        flist = fmain and fmain.get("flist")
+        if not flist:
+            return extra_info
+
+        for li in flist.get("items"):
+            if not li.get("key"):
+                # get_extra_info_from() gives up at the first li without key
+                break
+
+            key = li.get("key").text
+            value = li.text.replace(key, "").strip()
+
+            key = key.replace(":", "").strip()
+            extra_info[key] = value
+
+        return extra_info
+
+    def get_film_links(self, page: Match, post_type: str = "tvshows") -> dict:
+        film_links = {}
+        if post_type == "tvshows":
+            series_center = page.get("series_center")
+            if series_center:
+                for fullsfeature in series_center.get("episodes"):
+                    span = fullsfeature.get("title")
+                    episode_title = "" if not span else span.text.strip()
+
+                    episode_links = {}
+                    for li in fullsfeature.get("links"):
+                        if li.get("link"):
+                            episode_links[li.text.strip()] = li.get("link").value
+
+                    film_links[episode_title] = episode_links
+        else:
+            primary_nav_wrap = page.get("primary_nav_wrap")
+            if not primary_nav_wrap:
+                raise ValueError("No nav#primary_nav_wrap on the page")
+
+            for li in primary_nav_wrap.get("servers"):
+                child_ul = li.get("menu")
+                if not child_ul:
+                    continue
+
+                server_links = {}
+                for child_ul_li in child_ul.get("links"):
+                    if child_ul_li.get("link"):
+                        name = child_ul_li.text.strip()
+                        server_links[name] = child_ul_li.get("link").value
+
+                film_links[li.text.strip()] = server_links
+
+        return film_links
+
+
+film_extractor = FilmExtractor()
@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from _kvstore import STATE_DB_PATH, transaction
+from settings import CONFIG
+
+# Attempts at a film that keeps failing before it is left for a human to look at
+FRONTIER_MAX_RETRIES = getattr(CONFIG, "FRONTIER_MAX_RETRIES", 5)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier_sections (
+    section TEXT PRIMARY KEY,
+    pass INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS frontier_pages (
+    section TEXT NOT NULL,
+    pass INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    films INTEGER NOT NULL,
+    done_at REAL NOT NULL,
+    PRIMARY KEY (section, pass, page)
+);
+CREATE TABLE IF NOT EXISTS frontier_failed_films (
+    href TEXT PRIMARY KEY,
+    section TEXT NOT NULL,
+    title TEXT NOT NULL,
+    cover_img_src TEXT NOT NULL,
+    post_type TEXT NOT NULL,
+    retries INTEGER NOT NULL DEFAULT 0,
+    queued INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    failed_at REAL NOT NULL
+);
+"""
+
+
+class Frontier:
+    """Persisted progress of one section's backfill (movies, tvshows).
+
+    A pass walks the listing pages from first_page to the last one. Pages
+    are recorded once all their films are written, so after a restart
+    next_page() resumes at the first page of the pass not done yet. Films
+    that failed are kept with their retry count until they succeed or reach
+    FRONTIER_MAX_RETRIES.
+    """
+
+    def __init__(self, section: str, first_page: int = 2, path: str = STATE_DB_PATH):
+        self.section = section
+        self.first_page = first_page
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def get_conn(self) -> sqlite3.Connection:
+        if self.conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO frontier_sections (section) VALUES (?)",
+                (self.section,),
+            )
+            # Retries handed out before a restart never came back
+            conn.execute(
+                "UPDATE frontier_failed_films SET queued = 0 WHERE section = ?",
+                (self.section,),
+            )
+            self.conn = conn
+
+        return self.conn
+
+    def execute(self, query: str, data: tuple = ()) -> list:
+        with self.lock:
+            return self.get_conn().execute(query, data).fetchall()
+
+    def get_pass(self) -> int:
+        return self.execute(
+            "SELECT pass FROM frontier_sections WHERE section = ?", (self.section,)
+        )[0][0]
+
+    def next_page(self, after: int = None) -> int:
+        """First page after `after` not done in the current pass."""
+        page = self.first_page if after is None else after + 1
+        done = {
+            row[0]
+            for row in self.execute(
+                "SELECT page FROM frontier_pages "
+                "WHERE section = ? AND pass = ? AND page >= ?",
+                (self.section, self.get_pass(), page),
+            )
+        }
+        while page in done:
+            page += 1
+
+        return page
+
+    def complete_page(self, page: int, films: int, pass_number: int = None):
+        """pass_number is the pass the page was queued in, its films may
+        finish after start_pass()."""
+        self.execute(
+            "INSERT OR REPLACE INTO frontier_pages "
+            "(section, pass, page, films, done_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                self.section,
+                pass_number or self.get_pass(),
+                page,
+                films,
+                time.time(),
+            ),
+        )
+
+    def start_pass(self):
+        """Past the last page: start over from first_page."""
+        with self.lock:
+            with transaction(self.get_conn()) as conn:
+                conn.execute(
+                    "UPDATE frontier_sections SET pass = pass + 1 WHERE section = ?",
+                    (self.section,),
+                )
+                conn.execute(
+                    "DELETE FROM frontier_pages WHERE section = ?", (self.section,)
+                )
+
+    def fail_film(self, film: tuple, error: str):
+        href, title, cover_img_src, post_type = film
+        self.execute(
+            """INSERT INTO frontier_failed_films
+(href, section, title, cover_img_src, post_type, retries, last_error, failed_at)
+VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+ON CONFLICT (href) DO UPDATE SET
+retries = retries + 1, queued = 0, last_error = excluded.last_error,
+failed_at = excluded.failed_at""",
+            (href, self.section, title, cover_img_src, post_type, error, time.time()),
+        )
+
+    def clear_film(self, href: str):
+        self.execute("DELETE FROM frontier_failed_films WHERE href = ?", (href,))
+
+    def take_retries(self, limit: int = 100) -> list:
+        """Failed films still worth retrying, marked as queued so they are
+        only handed out once."""
+        with self.lock:
+            with transaction(self.get_conn(), "BEGIN IMMEDIATE") as conn:
+                films = conn.execute(
+                    """SELECT href, title, cover_img_src, post_type
+FROM frontier_failed_films
+WHERE section = ? AND queued = 0 AND retries < ?
+ORDER BY failed_at LIMIT ?""",
+                    (self.section, FRONTIER_MAX_RETRIES, limit),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE frontier_failed_films SET queued = 1 WHERE href = ?",
+                    [(film[0],) for film in films],
+                )
+
+        return films
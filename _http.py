@@ -0,0 +1,461 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from settings import CONFIG
+
+# Number of per-host connection pools kept, and connections kept per host
+HTTP_POOL_CONNECTIONS = getattr(CONFIG, "HTTP_POOL_CONNECTIONS", 10)
+HTTP_POOL_MAXSIZE = getattr(CONFIG, "HTTP_POOL_MAXSIZE", 16)
+# (connect, read) seconds, used when the caller does not pass a timeout
+HTTP_TIMEOUT = getattr(CONFIG, "HTTP_TIMEOUT", (10, 30))
+# (requests per second, burst) allowed per host, and for hosts not listed, e.g.
+# {"french-stream.gg": (4, 8), "cpasmieux.monster": (2, 4)}. A rate of 0
+# means no limit.
+HTTP_RATE_LIMITS = getattr(CONFIG, "HTTP_RATE_LIMITS", {})
+HTTP_RATE_LIMIT = getattr(CONFIG, "HTTP_RATE_LIMIT", (5, 10))
+# Attempts after the first one, on connection errors, timeouts and the
+# statuses below, waiting a random 0..min(BACKOFF_MAX, BACKOFF_BASE * 2^n)
+# seconds or what Retry-After asks for
+HTTP_RETRIES = getattr(CONFIG, "HTTP_RETRIES", 3)
+HTTP_BACKOFF_BASE = getattr(CONFIG, "HTTP_BACKOFF_BASE", 0.5)
+HTTP_BACKOFF_MAX = getattr(CONFIG, "HTTP_BACKOFF_MAX", 30)
+HTTP_RETRY_AFTER_MAX = getattr(CONFIG, "HTTP_RETRY_AFTER_MAX", 300)
+HTTP_RETRY_STATUSES = [429, 500, 502, 503, 504]
+# Consecutive 5xx/timeouts/connection errors that pause a host, and for how
+# long before a single probe request is let through
+HTTP_BREAKER_THRESHOLD = getattr(CONFIG, "HTTP_BREAKER_THRESHOLD", 5)
+HTTP_BREAKER_COOLDOWN = getattr(CONFIG, "HTTP_BREAKER_COOLDOWN", 60)
+HTTP_CACHE_DIR = getattr(CONFIG, "HTTP_CACHE_DIR", "cache/http")
+# Entries not validated for this many seconds are dropped, then the least
+# recently validated ones until the cache fits in HTTP_CACHE_MAX_BYTES. Swept
+# at most once per HTTP_CACHE_SWEEP_INTERVAL seconds, 0 disables a limit.
+HTTP_CACHE_MAX_AGE = getattr(CONFIG, "HTTP_CACHE_MAX_AGE", 7 * 24 * 3600)
+HTTP_CACHE_MAX_BYTES = getattr(CONFIG, "HTTP_CACHE_MAX_BYTES", 1024**3)
+HTTP_CACHE_SWEEP_INTERVAL = getattr(CONFIG, "HTTP_CACHE_SWEEP_INTERVAL", 3600)
+# Temp files left this long belong to a writer that died mid-save
+HTTP_CACHE_TMP_MAX_AGE = 3600
+# Response headers kept with a cached body
+HTTP_CACHE_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+try:
+    # urllib3 decodes brotli bodies transparently once one of these is installed
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        import brotlicffi  # noqa: F401
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average and up to `burst` at
+    once after a quiet spell. Shared by all threads."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, returns how long to wait before it may be used."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """One TokenBucket per host, configured by HTTP_RATE_LIMITS."""
+
+    def __init__(self, limits: dict = None, default: tuple = HTTP_RATE_LIMIT):
+        self.limits = HTTP_RATE_LIMITS if limits is None else limits
+        self.default = default
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, host: str) -> TokenBucket:
+        with self.lock:
+            if host not in self.buckets:
+                rate, burst = self.limits.get(host, self.default)
+                self.buckets[host] = TokenBucket(rate, burst) if rate > 0 else None
+            return self.buckets[host]
+
+    def acquire(self, url: str):
+        bucket = self.get_bucket(urlsplit(url).hostname)
+        if bucket is not None:
+            bucket.acquire()
+
+
+def get_backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number attempt + 1."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2**attempt))
+
+
+def get_retry_after(response: requests.Response) -> float:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max(seconds, 0), HTTP_RETRY_AFTER_MAX)
+
+
+class CircuitBreaker:
+    """Pauses a host after `threshold` consecutive failures.
+
+    While a host is paused, requests to it wait instead of being sent. After
+    `cooldown` seconds one probe request goes through: success resumes the
+    host, failure pauses it again."""
+
+    def __init__(
+        self,
+        threshold: int = HTTP_BREAKER_THRESHOLD,
+        cooldown: float = HTTP_BREAKER_COOLDOWN,
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = {}
+        # Host -> monotonic time it may be probed again
+        self.paused_until = {}
+        self.probing = set()
+        self.condition = threading.Condition()
+
+    def wait(self, host: str) -> bool:
+        """Block while host is paused. True when the caller is its probe."""
+        with self.condition:
+            while True:
+                paused_until = self.paused_until.get(host)
+                if paused_until is None:
+                    return False
+
+                wait = paused_until - time.monotonic()
+                if wait <= 0 and host not in self.probing:
+                    self.probing.add(host)
+                    return True
+
+                self.condition.wait(wait if wait > 0 else None)
+
+    @contextmanager
+    def attempt(self, host: str):
+        """wait() for host around one request. A probe that ends without
+        recording a result, e.g. on KeyboardInterrupt or SystemExit, gives
+        its place back, otherwise the host would never be probed again."""
+        is_probe = self.wait(host)
+        try:
+            yield
+        finally:
+            if is_probe:
+                with self.condition:
+                    self.probing.discard(host)
+                    self.condition.notify_all()
+
+    def record_success(self, host: str):
+        with self.condition:
+            self.failures.pop(host, None)
+            if self.paused_until.pop(host, None) is not None:
+                logging.info(f"Resuming requests to {host}")
+            self.probing.discard(host)
+            self.condition.notify_all()
+
+    def record_failure(self, host: str):
+        with self.condition:
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if host in self.probing or self.failures[host] >= self.threshold:
+                logging.warning(
+                    f"Pausing requests to {host} for {self.cooldown}s after "
+                    f"{self.failures[host]} failures"
+                )
+                self.paused_until[host] = time.monotonic() + self.cooldown
+            self.probing.discard(host)
+            self.condition.notify_all()
+
+
+class HttpClient:
+    """Keep-alive HTTP layer shared by every crawler thread.
+
+    All threads send through one HTTPAdapter, i.e. one urllib3 PoolManager
+    holding a connection pool per host, so DNS, TCP and TLS setup is paid
+    once per connection instead of once per request. Each thread gets its
+    own Session on top of it because Session state is not thread-safe.
+    Requests are paced per host by rate_limiter, retried with backoff and
+    held back by breaker while their host is failing.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = HTTP_POOL_CONNECTIONS,
+        pool_maxsize: int = HTTP_POOL_MAXSIZE,
+        timeout=HTTP_TIMEOUT,
+        rate_limiter: RateLimiter = None,
+        breaker: CircuitBreaker = None,
+        retries: int = HTTP_RETRIES,
+    ):
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = retries
+        self.local = threading.local()
+
+    def get_session(self) -> requests.Session:
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self.local.session = session
+
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying it up to `retries` times. The response
+        of the last attempt is returned even when its status is an error."""
+        kwargs.setdefault("timeout", self.timeout)
+        retries = kwargs.pop("retries", self.retries)
+        host = urlsplit(url).hostname
+
+        for attempt in range(retries + 1):
+            with self.breaker.attempt(host):
+                self.rate_limiter.acquire(url)
+                try:
+                    response = self.get_session().request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.breaker.record_failure(host)
+                    if attempt == retries:
+                        raise
+                    delay = get_backoff(attempt)
+                    logging.warning(
+                        f"{method} {url} failed ({e}), retry in {delay:.1f}s"
+                    )
+                except Exception:
+                    self.breaker.record_failure(host)
+                    raise
+                else:
+                    if response.status_code >= 500:
+                        self.breaker.record_failure(host)
+                    else:
+                        self.breaker.record_success(host)
+
+                    if (
+                        response.status_code not in HTTP_RETRY_STATUSES
+                        or attempt == retries
+                    ):
+                        return response
+
+                    delay = get_retry_after(response)
+                    if delay is None:
+                        delay = get_backoff(attempt)
+                    logging.warning(
+                        f"{method} {url} returned {response.status_code}, "
+                        f"retry in {delay:.1f}s"
+                    )
+
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+http_client = HttpClient()
+
+
+class HttpCache:
+    """On-disk cache of GET responses that the server validates with ETag or
+    Last-Modified.
+
+    A cached URL is re-requested with If-None-Match / If-Modified-Since; a
+    304 answer is served from disk, so polling an unchanged page moves no
+    body bytes. Entries are swept by age and total size, see sweep().
+    """
+
+    def __init__(
+        self,
+        directory: str = HTTP_CACHE_DIR,
+        client: HttpClient = None,
+        max_age: float = HTTP_CACHE_MAX_AGE,
+        max_bytes: int = HTTP_CACHE_MAX_BYTES,
+        sweep_interval: float = HTTP_CACHE_SWEEP_INTERVAL,
+    ):
+        self.directory = Path(directory)
+        self.client = client or http_client
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        # Swept on the first save, then every sweep_interval
+        self.swept_at = None
+        self.sweep_lock = threading.Lock()
+
+    def get_paths(self, url: str) -> list:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        folder = self.directory / key[:2]
+        return [folder / f"{key}.json", folder / f"{key}.body"]
+
+    def load(self, url: str) -> dict:
+        meta_path, body_path = self.get_paths(url)
+        try:
+            entry = json.loads(meta_path.read_text())
+            entry["body"] = body_path.read_bytes()
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def get_tmp_path(self, path: Path) -> Path:
+        # Unique across the threads of every crawler process sharing the cache
+        return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def save(self, url: str, headers: dict, encoding: str, body: bytes = None):
+        meta_path, body_path = self.get_paths(url)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to temp files and rename, so concurrent readers never see a
+        # half-written entry
+        if body is not None:
+            tmp_body_path = self.get_tmp_path(body_path)
+            tmp_body_path.write_bytes(body)
+            os.replace(tmp_body_path, body_path)
+
+        tmp_meta_path = self.get_tmp_path(meta_path)
+        tmp_meta_path.write_text(
+            json.dumps({"url": url, "headers": headers, "encoding": encoding})
+        )
+        os.replace(tmp_meta_path, meta_path)
+
+        self.maybe_sweep()
+
+    def maybe_sweep(self):
+        now = time.monotonic()
+        if self.swept_at is not None and now - self.swept_at < self.sweep_interval:
+            return
+        if not self.sweep_lock.acquire(blocking=False):
+            return
+
+        try:
+            self.swept_at = now
+            self.sweep()
+        except OSError as e:
+            logging.warning(f"Failed to sweep the HTTP cache: {e}")
+        finally:
+            self.sweep_lock.release()
+
+    def sweep(self):
+        """Drop the entries not validated for max_age seconds, then the least
+        recently validated ones until the cache fits in max_bytes."""
+        now = time.time()
+        # key -> [meta mtime, total size, paths]
+        entries = {}
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            if path.suffix == ".tmp":
+                if now - stat.st_mtime > HTTP_CACHE_TMP_MAX_AGE:
+                    path.unlink(missing_ok=True)
+                continue
+
+            entry = entries.setdefault(path.stem, [0, 0, []])
+            if path.suffix == ".json":
+                # Rewritten on every 304, so it dates the last validation
+                entry[0] = stat.st_mtime
+            entry[1] += stat.st_size
+            entry[2].append(path)
+
+        total_bytes = sum(entry[1] for entry in entries.values())
+        removed = 0
+        for validated_at, size, paths in sorted(entries.values()):
+            is_expired = self.max_age and now - validated_at > self.max_age
+            is_over = self.max_bytes and total_bytes > self.max_bytes
+            if not is_expired and not is_over:
+                break
+
+            for path in paths:
+                path.unlink(missing_ok=True)
+            total_bytes -= size
+            removed += 1
+
+        if removed:
+            logging.info(f"Swept {removed} entries from the HTTP cache")
+
+    def get_cached_headers(self, response: requests.Response) -> dict:
+        return {
+            key: response.headers[key]
+            for key in HTTP_CACHE_HEADERS
+            if key in response.headers
+        }
+
+    def build_response(self, url: str, entry: dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = entry["encoding"]
+        response._content = entry["body"]
+        response.from_cache = True
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        entry = self.load(url)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            if "ETag" in entry["headers"]:
+                headers["If-None-Match"] = entry["headers"]["ETag"]
+            if "Last-Modified" in entry["headers"]:
+                headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+        response = self.client.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry:
+            entry["headers"].update(self.get_cached_headers(response))
+            self.save(url, entry["headers"], entry["encoding"])
+            return self.build_response(url, entry)
+
+        response.from_cache = False
+        cached_headers = self.get_cached_headers(response)
+        if response.status_code == 200 and (
+            "ETag" in cached_headers or "Last-Modified" in cached_headers
+        ):
+            self.save(url, cached_headers, response.encoding, response.content)
+
+        return response
+
+
+http_cache = HttpCache()
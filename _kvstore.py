@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from settings import CONFIG
+
+# Local crawler state (page hashes, link cache, crawl frontier)
+STATE_DB_PATH = getattr(CONFIG, "STATE_DB_PATH", "data/crawler.sqlite3")
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection, begin: str = "BEGIN"):
+    """Explicit transaction on an autocommit connection. Rolled back on any
+    error, a failed one left open would make every later BEGIN fail."""
+    conn.execute(begin)
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+class KVStore:
+    """Persistent key -> value table in a local SQLite file.
+
+    Thread-safe, and safe for the movie and series crawlers to share: the
+    file runs in WAL mode so readers never block the writer.
+    """
+
+    def __init__(self, table: str, path: str = STATE_DB_PATH):
+        self.table = table
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def get_conn(self) -> sqlite3.Connection:
+        if self.conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self.conn = conn
+
+        return self.conn
+
+    def get(self, key: str, default: str = None) -> str:
+        with self.lock:
+            row = (
+                self.get_conn()
+                .execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,))
+                .fetchone()
+            )
+        return row[0] if row else default
+
+    def set(self, key: str, value: str):
+        self.set_many([(key, value)])
+
+    def set_many(self, items: list):
+        with self.lock:
+            with transaction(self.get_conn()) as conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                    items,
+                )
+
+    def clear(self):
+        with self.lock:
+            self.get_conn().execute(f"DELETE FROM {self.table}")
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
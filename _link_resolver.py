@@ -0,0 +1,74 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from _link_store import link_store
+from settings import CONFIG
+
+# Distinct ajax link requests allowed in flight at once
+LINK_RESOLVER_CONCURRENCY = getattr(CONFIG, "LINK_RESOLVER_CONCURRENCY", 4)
+
+
+class LinkResolver:
+    """Resolves server links through link_store and fetch().
+
+    Identical requests made while one is in flight wait for its result
+    instead of calling fetch() again (singleflight), distinct ones run in
+    parallel up to `concurrency`, and every fetched link is stored once.
+    """
+
+    def __init__(self, fetch, concurrency: int = LINK_RESOLVER_CONCURRENCY):
+        # fetch(data_name, data_hash, data_episode, id_or_episode) -> link
+        self.fetch = fetch
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def resolve(
+        self,
+        data_name: str,
+        data_hash: str,
+        data_episode: str,
+        id_or_episode: str = "episode",
+    ) -> str:
+        link = link_store.get(data_hash, data_name, data_episode)
+        if link is not None:
+            logging.debug(f"Server link {data_hash}|{data_name}|{data_episode} cached")
+            return link
+
+        key = (data_hash, data_name, data_episode, id_or_episode)
+        with self.lock:
+            future = self.in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self.in_flight[key] = Future()
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            # The previous leader may have stored it since the lookup above
+            link = link_store.get(data_hash, data_name, data_episode)
+            if link is None:
+                with self.slots:
+                    link = self.fetch(data_name, data_hash, data_episode, id_or_episode)
+                link_store.add(data_hash, data_name, data_episode, link)
+            future.set_result(link)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+        return link
+
+    def resolve_many(self, requests: list) -> list:
+        """resolve() every (data_name, data_hash, data_episode[, id_or_episode])
+        tuple in parallel. Returns the links in order, or the exception a
+        request failed with in its place."""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self.resolve, *request) for request in requests]
+
+        return [future.exception() or future.result() for future in futures]
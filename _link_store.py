@@ -0,0 +1,121 @@
+import atexit
+import logging
+import threading
+from pathlib import Path
+
+from _kvstore import KVStore
+from settings import CONFIG
+
+# Results kept in memory before being written to the store in one transaction
+SERVER_LINKS_BATCH_SIZE = getattr(CONFIG, "SERVER_LINKS_BATCH_SIZE", 50)
+IMPORT_BATCH_SIZE = 10_000
+# Pipe-delimited hash|name|episode|link file the links used to be appended to
+LEGACY_LINKS_FILE = getattr(CONFIG, "GETTED_SERVER_LINKS_FILE", "")
+
+
+class LinkStore:
+    """get_server_link() results keyed by (hash, name, episode).
+
+    Lookups are a single primary key read. New links are buffered and
+    written SERVER_LINKS_BATCH_SIZE at a time, and at exit. The legacy links
+    file is imported once, on first use.
+    """
+
+    def __init__(
+        self,
+        store: KVStore = None,
+        batch_size: int = SERVER_LINKS_BATCH_SIZE,
+        legacy_file: str = LEGACY_LINKS_FILE,
+    ):
+        self.store = store or KVStore("server_links")
+        self.batch_size = batch_size
+        self.legacy_file = legacy_file
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.is_ready = False
+
+        atexit.register(self.flush)
+
+    def get_key(self, data_hash: str, data_name: str, data_episode: str) -> str:
+        return "|".join([data_hash, data_name, data_episode])
+
+    def get(self, data_hash: str, data_name: str, data_episode: str) -> str:
+        self.ensure_imported()
+        key = self.get_key(data_hash, data_name, data_episode)
+        with self.lock:
+            if key in self.pending:
+                return self.pending[key]
+
+        return self.store.get(key)
+
+    def add(self, data_hash: str, data_name: str, data_episode: str, link: str):
+        key = self.get_key(data_hash, data_name, data_episode)
+        with self.lock:
+            self.pending[key] = link
+            is_full = len(self.pending) >= self.batch_size
+
+        if is_full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+
+        if pending:
+            self.store.set_many(list(pending.items()))
+
+    def ensure_imported(self):
+        if self.is_ready:
+            return
+
+        with self.lock:
+            if not self.is_ready:
+                if self.legacy_file and Path(self.legacy_file).is_file():
+                    self.import_file(self.legacy_file)
+                self.is_ready = True
+
+    def import_file(self, path: str, force: bool = False) -> int:
+        """Load a hash|name|episode|link file, once per path unless forced.
+
+        Lines without three pipes continue the link of the previous line:
+        the old `echo` appends wrote multi-line responses as they were."""
+        marker = f"#imported|{Path(path).resolve()}"
+        if not force and marker in self.store:
+            return 0
+
+        logging.info(f"Importing server links from {path}")
+        count = 0
+        batch = {}
+        # [key, link] of the line being read, kept until its last line
+        record = None
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                parts = line.split("|", 3)
+                if len(parts) == 4:
+                    if record:
+                        batch[record[0]] = record[1]
+                    record = ["|".join(parts[:3]), parts[3]]
+                    count += 1
+                elif record:
+                    record[1] += "\n" + line
+
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    self.store.set_many(list(batch.items()))
+                    batch = {}
+
+        if record:
+            batch[record[0]] = record[1]
+        batch[marker] = str(count)
+        self.store.set_many(list(batch.items()))
+        logging.info(f"Imported {count} server links from {path}")
+
+        return count
+
+
+link_store = LinkStore()
+
+
+if __name__ == "__main__":
+    link_store.import_file(LEGACY_LINKS_FILE, force=True)
@@ -0,0 +1,321 @@
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from _frontier import Frontier
+from _write_buffer import write_buffer
+from base import CRAWL_CONCURRENCY, Crawler, parse_film_page
+from dootheme import doohelper
+from helper import helper
+from settings import CONFIG
+
+PIPELINE_PARSE_WORKERS = getattr(CONFIG, "PIPELINE_PARSE_WORKERS", 2)
+# Parse in this many worker processes instead of threads, 0 to parse in-process
+PIPELINE_PARSE_PROCESSES = getattr(CONFIG, "PIPELINE_PARSE_PROCESSES", 0)
+# More than one writer can race on creating a term neither has cached yet
+PIPELINE_WRITER_SHARDS = getattr(CONFIG, "PIPELINE_WRITER_SHARDS", 1)
+# Films waiting between two stages before the earlier stage blocks
+PIPELINE_QUEUE_SIZE = getattr(CONFIG, "PIPELINE_QUEUE_SIZE", 64)
+# How often blocked stages check whether another stage died
+QUEUE_POLL_INTERVAL = 0.5
+
+STOP = object()
+
+
+class PipelineError(RuntimeError):
+    """A pipeline stage died, the pipeline is stopped."""
+
+
+def exit_on_sigterm():
+    """Stop on SIGTERM like on Ctrl+C, so the pipeline still writes what it
+    queued and flushes the write buffer instead of being killed mid-film."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
+class CrawlPipeline:
+    """Listing fetch -> film fetch -> parse -> write, as separate stages.
+
+    crawl_page() fetches a listing page in the caller's thread and queues its
+    films. Fetch workers download them, parse workers turn them into
+    film_data/film_links, and writer threads insert them. Stages are joined by
+    bounded queues: a full queue blocks the stage feeding it, so throughput
+    follows the slowest stage without films piling up in memory. Films with
+    the same root title always go to the same writer, so the seasons of a
+    series are never inserted concurrently.
+
+    If a stage dies on an error it did not attribute to a film, every stage
+    stops and the next crawl_page(), retry_films() or close() raises it.
+    """
+
+    def __init__(
+        self,
+        crawler: Crawler = None,
+        fetch_workers: int = CRAWL_CONCURRENCY,
+        parse_workers: int = PIPELINE_PARSE_WORKERS,
+        parse_processes: int = PIPELINE_PARSE_PROCESSES,
+        writer_shards: int = PIPELINE_WRITER_SHARDS,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        frontier: Frontier = None,
+    ):
+        self.crawler = crawler or Crawler()
+        self.frontier = frontier
+        # Listing page -> [films not finished yet, films, frontier pass]
+        self.pages = {}
+        self.lock = threading.Lock()
+        self.fetch_workers = max(fetch_workers, 1)
+        # One parse thread feeds each process
+        self.parse_workers = max(parse_workers, parse_processes, 1)
+        self.parse_processes = parse_processes
+        self.parse_pool = None
+        self.fetch_queue = queue.Queue(queue_size)
+        self.parse_queue = queue.Queue(queue_size)
+        self.write_queues = [
+            queue.Queue(queue_size) for _ in range(max(writer_shards, 1))
+        ]
+        self.fetchers = []
+        self.parsers = []
+        self.writers = []
+        self.error = None
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        if self.parse_processes:
+            # Not forked: the fetch threads may hold locks the child would inherit
+            self.parse_pool = ProcessPoolExecutor(
+                max_workers=self.parse_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self.fetchers = [
+            self.start_thread(f"fetch-{i}", self.run_fetcher)
+            for i in range(self.fetch_workers)
+        ]
+        self.parsers = [
+            self.start_thread(f"parse-{i}", self.run_parser)
+            for i in range(self.parse_workers)
+        ]
+        self.writers = [
+            self.start_thread(f"write-{i}", self.run_writer, write_queue)
+            for i, write_queue in enumerate(self.write_queues)
+        ]
+
+    def start_thread(self, name: str, target, *args) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.run_stage, args=(target, *args), name=name, daemon=True
+        )
+        thread.start()
+        return thread
+
+    def run_stage(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as e:
+            self.abort(e)
+
+    def abort(self, error: BaseException):
+        """Stop every stage, the first error is the one raised."""
+        with self.lock:
+            if self.error is None:
+                self.error = error
+                logging.error(
+                    f"Crawl pipeline stopped by {threading.current_thread().name}: "
+                    f"{error!r}"
+                )
+        self.stopped.set()
+
+    def raise_error(self):
+        error = self.error
+        if error is None:
+            return
+        if isinstance(error, Exception):
+            raise PipelineError(f"Crawl pipeline stage failed: {error!r}") from error
+        # KeyboardInterrupt, SystemExit...
+        raise error
+
+    def get(self, stage_queue: queue.Queue):
+        """Next item of stage_queue, STOP once the pipeline is stopped."""
+        while not self.stopped.is_set():
+            try:
+                return stage_queue.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+        return STOP
+
+    def put(self, stage_queue: queue.Queue, item):
+        """Block until stage_queue takes item, or raise if a stage died."""
+        while True:
+            self.raise_error()
+            try:
+                stage_queue.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def close(self):
+        """Wait for every queued film to be written, then stop the workers.
+
+        Raises the error a stage died with, if any."""
+        try:
+            self.stop_stage([self.fetch_queue] * len(self.fetchers), self.fetchers)
+            self.stop_stage([self.parse_queue] * len(self.parsers), self.parsers)
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+                self.parse_pool = None
+            self.stop_stage(self.write_queues, self.writers)
+        finally:
+            # After a failure, stop what is still running instead of draining
+            self.stopped.set()
+            for thread in self.fetchers + self.parsers + self.writers:
+                thread.join()
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown(cancel_futures=True)
+                self.parse_pool = None
+            write_buffer.flush()
+
+        self.raise_error()
+
+    def stop_stage(self, queues: list, threads: list):
+        for stage_queue in queues:
+            self.put(stage_queue, STOP)
+        for thread in threads:
+            thread.join()
+
+    def crawl_page(
+        self,
+        url: str = CONFIG.FRENCH_STREAM_SERIES,
+        post_type: str = "tvshows",
+        page: int = None,
+    ) -> int:
+        """Queue the films of a listing page, same return as Crawler.crawl_page().
+
+        With a frontier, listing page number `page` is recorded as done once
+        all its films are written or recorded as failed."""
+        self.raise_error()
+        films = self.crawler.get_films(url)
+        if films is None:
+            return 0
+
+        if self.frontier is not None and page is not None:
+            if films:
+                pass_number = self.frontier.get_pass()
+                with self.lock:
+                    self.pages[page] = [len(films), len(films), pass_number]
+            else:
+                self.frontier.complete_page(page, 0)
+
+        for href, title, cover_img_src in films:
+            self.put(self.fetch_queue, ((href, title, cover_img_src, post_type), page))
+
+        return 1
+
+    def retry_films(self, films: list):
+        """Queue (href, title, cover_img_src, post_type) films again."""
+        for film in films:
+            self.put(self.fetch_queue, (tuple(film), None))
+
+    def finish_film(self, film: tuple, page: int, error: Exception = None):
+        if error is not None:
+            helper.error_log(f"Failed to crawl film\n{film[0]}\n{error}", "page.log")
+
+        if self.frontier is None:
+            return
+
+        if error is not None:
+            self.frontier.fail_film(film, repr(error))
+        else:
+            self.frontier.clear_film(film[0])
+
+        if page is None:
+            return
+
+        with self.lock:
+            pending = self.pages.get(page)
+            if pending is None:
+                # Its page was already completed
+                return
+            pending[0] -= 1
+            is_done = not pending[0]
+            if is_done:
+                del self.pages[page]
+
+        if is_done:
+            self.frontier.complete_page(page, pending[1], pending[2])
+
+    def get_write_queue(self, title: str) -> queue.Queue:
+        root_title = doohelper.get_title_and_season_number(title)[0]
+        return self.write_queues[hash(root_title) % len(self.write_queues)]
+
+    def run_fetcher(self):
+        while True:
+            item = self.get(self.fetch_queue)
+            if item is STOP:
+                return
+
+            film, page = item
+            try:
+                markup = self.crawler.fetch_film(film[0])
+            except Exception as e:
+                self.finish_film(film, page, e)
+                continue
+
+            self.put(self.parse_queue, (markup, film, page))
+
+    def run_parser(self):
+        while True:
+            item = self.get(self.parse_queue)
+            if item is STOP:
+                return
+
+            markup, film, page = item
+            try:
+                crawled = self.parse_film(markup, *film)
+            except Exception as e:
+                self.finish_film(film, page, e)
+                continue
+
+            if crawled:
+                film_data, film_links = crawled
+                self.put(
+                    self.get_write_queue(film[1]), (film, page, film_data, film_links)
+                )
+            else:
+                self.finish_film(film, page)
+
+    def parse_film(self, markup: bytes, *film):
+        if self.parse_pool is None:
+            return self.crawler.parse_film(markup, *film)
+
+        # film_hashes stays with this process, the worker only gets the hash
+        known_hash = self.crawler.get_known_hash(film[0])
+        return self.parse_pool.submit(
+            parse_film_page,
+            markup,
+            *film,
+            restricted_parse=self.crawler.restricted_parse,
+            known_hash=known_hash,
+        ).result()
+
+    def run_writer(self, write_queue: queue.Queue):
+        while True:
+            item = self.get(write_queue)
+            if item is STOP:
+                return
+
+            film, page, film_data, film_links = item
+            try:
+                self.crawler.write_film(film[0], film_data, film_links)
+            except Exception as e:
+                self.finish_film(film, page, e)
+            else:
+                self.finish_film(film, page)
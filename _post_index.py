@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+import unicodedata
+
+from _db import database
+from settings import CONFIG
+
+# Post types whose IDs are kept in memory; duplicate checks on them never
+# reach the database.
+ID_POST_TYPES = ("movies", "tvshows", "seasons")
+# Post types only tracked by a bloom filter, a few bits per post. A miss
+# after a catch-up is final, a hit still has to be confirmed by the database.
+BLOOM_POST_TYPES = ("episodes",)
+
+POST_INDEX_SYNC_INTERVAL = getattr(CONFIG, "POST_INDEX_SYNC_INTERVAL", 10)
+# Re-read this many IDs below the highest one seen, to catch rows of
+# transactions that were still open during the previous sync.
+POST_INDEX_SYNC_OVERLAP = getattr(CONFIG, "POST_INDEX_SYNC_OVERLAP", 1000)
+POST_INDEX_BLOOM_ERROR_RATE = getattr(CONFIG, "POST_INDEX_BLOOM_ERROR_RATE", 0.01)
+POST_INDEX_BLOOM_MIN_CAPACITY = 100_000
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little")
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        # Only count keys not seen before: sync() re-adds its overlap every
+        # time, and counting those would trigger needless rebuilds
+        is_new = False
+        for position in self.positions(key):
+            bit = 1 << (position & 7)
+            if not self.bits[position >> 3] & bit:
+                self.bits[position >> 3] |= bit
+                is_new = True
+        if is_new:
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(key)
+        )
+
+
+class PostIndex:
+    """(post_type, normalized post_title) -> post ID, so duplicate checks do
+    not full-scan the unindexed wp_posts.post_title.
+
+    Built with one streaming query on first use, updated by Dootheme inserts,
+    and caught up with rows written by other processes through an indexed
+    'ID >' range query at most every POST_INDEX_SYNC_INTERVAL seconds. Before
+    a post is reported missing, only the rows past the highest ID seen are
+    read (catch_up()), the overlap is left to the periodic sync."""
+
+    def __init__(self):
+        self.ids = {}
+        self.bloom = None
+        self.max_id = 0
+        self.synced_at = 0
+        self.lock = threading.RLock()
+
+    def normalize(self, title: str) -> str:
+        # Mirror the case and accent insensitive *_ci collations of post_title
+        title = unicodedata.normalize("NFKD", title)
+        title = "".join(ch for ch in title if not unicodedata.combining(ch))
+        return title.casefold().strip()
+
+    def load(self):
+        post_types = ", ".join(["%s"] * len(BLOOM_POST_TYPES))
+        bloom_posts = database.select_with(
+            f"""SELECT COUNT(*) FROM {CONFIG.TABLE_PREFIX}posts
+WHERE post_type IN ({post_types})""",
+            BLOOM_POST_TYPES,
+        )[0][0]
+
+        with self.lock:
+            self.ids = {}
+            self.bloom = BloomFilter(
+                max(POST_INDEX_BLOOM_MIN_CAPACITY, bloom_posts * 2),
+                POST_INDEX_BLOOM_ERROR_RATE,
+            )
+            self.max_id = 0
+            self.sync()
+
+        logging.info(
+            f"Indexed {len(self.ids)} posts and {self.bloom.count} episodes titles"
+        )
+
+    def sync(self):
+        with self.lock:
+            self.read_after(max(0, self.max_id - POST_INDEX_SYNC_OVERLAP))
+            self.synced_at = time.monotonic()
+
+    def catch_up(self):
+        with self.lock:
+            self.read_after(self.max_id)
+
+    def read_after(self, from_id: int):
+        post_types = (*ID_POST_TYPES, *BLOOM_POST_TYPES)
+        with self.lock:
+            for post_id, post_type, post_title in database.iter_select(
+                f"""SELECT ID, post_type, post_title FROM {CONFIG.TABLE_PREFIX}posts
+WHERE ID > %s AND post_type IN ({", ".join(["%s"] * len(post_types))})
+ORDER BY ID""",
+                (from_id, *post_types),
+            ):
+                self.remember(post_type, post_title, post_id)
+                self.max_id = max(self.max_id, post_id)
+
+            if self.bloom.count > self.bloom.capacity:
+                # Past its capacity the false positive rate climbs, rebuild it
+                self.load()
+
+    def ensure_fresh(self):
+        if self.bloom is None:
+            self.load()
+        elif time.monotonic() - self.synced_at > POST_INDEX_SYNC_INTERVAL:
+            self.sync()
+
+    def remember(self, post_type: str, post_title: str, post_id: int):
+        key = f"{post_type}\0{self.normalize(post_title)}"
+        with self.lock:
+            if post_type in ID_POST_TYPES:
+                self.ids.setdefault(key, post_id)
+            elif post_type in BLOOM_POST_TYPES:
+                self.bloom.add(key)
+
+        return key
+
+    def add(self, post_type: str, post_title: str, post_id: int):
+        self.ensure_fresh()
+        key = self.remember(post_type, post_title, post_id)
+        if post_type in ID_POST_TYPES:
+            database.on_rollback(lambda: self.discard(key, post_id))
+
+    def discard(self, key: str, post_id: int):
+        with self.lock:
+            if self.ids.get(key) == post_id:
+                del self.ids[key]
+
+    def might_exist(
+        self, post_type: str, post_title: str, catch_up: bool = True
+    ) -> bool:
+        """Whether the post may exist. On a miss, unless catch_up is False,
+        the posts another crawler added since the last sync are read first."""
+        self.ensure_fresh()
+        key = f"{post_type}\0{self.normalize(post_title)}"
+        if post_type not in ID_POST_TYPES and post_type not in BLOOM_POST_TYPES:
+            return True
+
+        if self.contains(post_type, key):
+            return True
+        if not catch_up:
+            return False
+
+        self.catch_up()
+        return self.contains(post_type, key)
+
+    def contains(self, post_type: str, key: str) -> bool:
+        if post_type in ID_POST_TYPES:
+            return key in self.ids
+
+        return key in self.bloom
+
+    def get_id(self, post_type: str, post_title: str) -> int:
+        """ID of the post, or 0 when it is missing or only in the bloom filter."""
+        self.ensure_fresh()
+        return self.ids.get(f"{post_type}\0{self.normalize(post_title)}", 0)
+
+
+post_index = PostIndex()
@@ -0,0 +1,83 @@
+import logging
+import threading
+
+from _db import database
+from settings import CONFIG
+
+
+class TermCache:
+    """(taxonomy, name) and (taxonomy, slug) -> (term_id, term_taxonomy_id).
+
+    Loaded from the database in one query on first use, then kept in sync by
+    the insert paths. A miss is not authoritative: other crawler processes
+    insert terms too, so callers still check the database before inserting.
+    """
+
+    def __init__(self):
+        self.by_name = {}
+        self.by_slug = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def normalize(self, value: str) -> str:
+        return value.replace("\n", "").strip().lower()
+
+    def preload(self):
+        rows = database.select_with(
+            f"""SELECT tt.taxonomy, t.name, t.slug, t.term_id, tt.term_taxonomy_id
+FROM {CONFIG.TABLE_PREFIX}terms t, {CONFIG.TABLE_PREFIX}term_taxonomy tt
+WHERE tt.term_id=t.term_id
+ORDER BY tt.term_taxonomy_id"""
+        )
+        with self.lock:
+            self.by_name = {}
+            self.by_slug = {}
+            for taxonomy, name, slug, term_id, term_taxonomy_id in rows:
+                ids = (term_id, term_taxonomy_id)
+                self.by_name.setdefault((taxonomy, self.normalize(name)), ids)
+                self.by_slug.setdefault((taxonomy, self.normalize(slug)), ids)
+            self.loaded = True
+
+        logging.info(f"Preloaded {len(rows)} terms")
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.preload()
+
+    def get(self, taxonomy: str, name: str = "", slug: str = ""):
+        self.ensure_loaded()
+        if slug:
+            return self.by_slug.get((taxonomy, self.normalize(slug)))
+
+        return self.by_name.get((taxonomy, self.normalize(name)))
+
+    def add(
+        self,
+        taxonomy: str,
+        term_id: int,
+        term_taxonomy_id: int,
+        name: str = "",
+        slug: str = "",
+    ):
+        ids = (term_id, term_taxonomy_id)
+        keys = []
+        with self.lock:
+            if name:
+                key = (taxonomy, self.normalize(name))
+                self.by_name[key] = ids
+                keys.append((self.by_name, key))
+            if slug:
+                key = (taxonomy, self.normalize(slug))
+                self.by_slug[key] = ids
+                keys.append((self.by_slug, key))
+
+        database.on_rollback(lambda: self.discard(keys, ids))
+
+    def discard(self, keys: list, ids: tuple):
+        with self.lock:
+            for index, key in keys:
+                if index.get(key) == ids:
+                    del index[key]
+
+
+term_cache = TermCache()
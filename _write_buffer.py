@@ -0,0 +1,162 @@
+import atexit
+import logging
+import threading
+import time
+
+from _db import database
+from settings import CONFIG
+
+WRITE_BUFFER_MAX_ROWS = getattr(CONFIG, "WRITE_BUFFER_MAX_ROWS", 5000)
+WRITE_BUFFER_MAX_DELAY_MS = getattr(CONFIG, "WRITE_BUFFER_MAX_DELAY_MS", 2000)
+# Share of max_allowed_packet a single INSERT may fill
+WRITE_BUFFER_PACKET_RATIO = 0.8
+# Quotes, commas and parentheses around every row of a multi-row INSERT
+ROW_OVERHEAD = 16
+
+
+class WriteBuffer:
+    """Write-behind buffer for postmeta/termmeta rows.
+
+    Rows added outside a transaction are shared across films and flushed
+    when WRITE_BUFFER_MAX_ROWS accumulate, when the next INSERT would no
+    longer fit in max_allowed_packet, after WRITE_BUFFER_MAX_DELAY_MS, and at
+    exit. Rows added inside Database.transaction() stay with that
+    transaction and are written right before it commits, or dropped if it
+    rolls back. Any read, update or delete mentioning a buffered table
+    flushes it first, so callers still read their own writes.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = WRITE_BUFFER_MAX_ROWS,
+        max_delay_ms: int = WRITE_BUFFER_MAX_DELAY_MS,
+    ):
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.rows = {}
+        self.row_count = 0
+        self.byte_count = 0
+        self.oldest_at = 0
+        self.lock = threading.RLock()
+        # Rows of this thread's open transaction
+        self.local = threading.local()
+        self.flusher = None
+
+        database.add_barrier(self.flush_for)
+        atexit.register(self.flush)
+
+    def get_row_size(self, row: tuple) -> int:
+        return ROW_OVERHEAD + sum(len(str(value).encode("utf-8")) for value in row)
+
+    def get_packet_budget(self) -> int:
+        return int(database.get_max_allowed_packet() * WRITE_BUFFER_PACKET_RATIO)
+
+    def add(self, table: str, rows: list):
+        if not rows:
+            return
+
+        if database.get_transaction_conn() is not None:
+            self.add_to_transaction(table, rows)
+            return
+
+        with self.lock:
+            if not self.row_count:
+                self.oldest_at = time.monotonic()
+            self.rows.setdefault(table, []).extend(rows)
+            self.row_count += len(rows)
+            self.byte_count += sum(self.get_row_size(row) for row in rows)
+            is_full = (
+                self.row_count >= self.max_rows
+                or self.byte_count >= self.get_packet_budget()
+            )
+
+        if is_full:
+            self.flush()
+        else:
+            self.start_flusher()
+
+    def add_to_transaction(self, table: str, rows: list):
+        pending = getattr(self.local, "rows", None)
+        if pending is None:
+            pending = self.local.rows = {}
+            database.before_commit(self.flush_transaction)
+            database.on_rollback(self.discard_transaction)
+
+        pending.setdefault(table, []).extend(rows)
+
+    def flush_transaction(self):
+        pending = getattr(self.local, "rows", None) or {}
+        self.local.rows = None
+        self.write(pending)
+
+    def discard_transaction(self):
+        self.local.rows = None
+
+    def flush(self):
+        if not self.row_count:
+            return
+
+        with self.lock:
+            pending = self.rows
+            self.rows = {}
+            self.row_count = 0
+            self.byte_count = 0
+
+            # The shared rows belong to no transaction, keep them out of the
+            # caller's one. Writing under the lock keeps flushes in order.
+            with database.outside_transaction():
+                self.write(pending)
+
+    def flush_for(self, query: str):
+        pending = getattr(self.local, "rows", None)
+        if pending and any(table in query for table in pending.keys()):
+            self.write(pending)
+            pending.clear()
+
+        if any(table in query for table in list(self.rows.keys())):
+            self.flush()
+
+    def write(self, pending: dict):
+        budget = self.get_packet_budget()
+        for table, rows in pending.items():
+            chunk = []
+            chunk_size = 0
+            for row in rows:
+                row_size = self.get_row_size(row)
+                if chunk and chunk_size + row_size > budget:
+                    self.insert_chunk(table, chunk)
+                    chunk = []
+                    chunk_size = 0
+                chunk.append(row)
+                chunk_size += row_size
+
+            if chunk:
+                self.insert_chunk(table, chunk)
+
+    def insert_chunk(self, table: str, chunk: list):
+        logging.info(f"Flushing {len(chunk)} rows into table {table}")
+        database.insert_many(table=table, data=chunk, chunk_size=len(chunk))
+
+    def start_flusher(self):
+        if self.flusher is not None and self.flusher.is_alive():
+            return
+
+        with self.lock:
+            # Started again if something killed it
+            if self.flusher is None or not self.flusher.is_alive():
+                self.flusher = threading.Thread(
+                    target=self.run_flusher, name="write-buffer", daemon=True
+                )
+                self.flusher.start()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(self.max_delay / 4)
+            if self.row_count and time.monotonic() - self.oldest_at >= self.max_delay:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error(f"Failed to flush write buffer: {e}")
+
+
+write_buffer = WriteBuffer()
@@ -1,20 +1,108 @@
+import hashlib
 import logging
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests import HTTPError
 
+from _extractor import film_extractor
+from _kvstore import KVStore
 from dootheme import Dootheme
 from helper import helper
 from settings import CONFIG
 
 logging.basicConfig(format="%(asctime)s %(levelname)s:%(message)s", level=logging.INFO)
 
+# Film pages of one listing page fetched and parsed in parallel
+CRAWL_CONCURRENCY = getattr(CONFIG, "CRAWL_CONCURRENCY", 8)
+# Skip parsing and inserting film pages whose content hash did not change
+SKIP_UNCHANGED_FILMS = getattr(CONFIG, "SKIP_UNCHANGED_FILMS", True)
+# Only build the trees of the page regions below, not scripts, ads and menus
+RESTRICTED_PARSE = getattr(CONFIG, "RESTRICTED_PARSE", True)
+
+# (tag, attribute, value) of the only regions crawl_film() and crawl_page() read
+FILM_REGIONS = [
+    ("div", "class", "fmain"),
+    ("div", "class", "series-center"),
+    ("nav", "id", "primary_nav_wrap"),
+]
+LISTING_REGIONS = [("div", "id", "dle-content")]
+
+# Film URL -> hash of the page regions the last successful insert was built from
+film_hashes = KVStore("film_hashes")
+
+
+def get_region_strainer(regions: list) -> SoupStrainer:
+    def is_region(name: str, attrs: dict) -> bool:
+        for tag, attr, value in regions:
+            if name != tag:
+                continue
+
+            # Multi-valued attributes are still raw strings while parsing
+            values = attrs.get(attr) or ""
+            if isinstance(values, str):
+                values = values.split() if attr == "class" else [values]
+            if value in values:
+                return True
+
+        return False
+
+    return SoupStrainer(is_region)
+
+
+def get_region_patterns(tag: str, attr: str, value: str) -> tuple:
+    """(start, tags) patterns of a region in raw markup: its opening tag, and
+    any opening or closing tag of the same name."""
+    value = re.escape(value)
+    start = rf"""<{tag}\b[^>]*\b{attr}\s*=\s*["']?[^"'>]*(?<![\w-]){value}(?![\w-])"""
+    tags = rf"<(/?){tag}\b[^>]*>"
+
+    return (
+        re.compile(start.encode(), re.IGNORECASE),
+        re.compile(tags.encode(), re.IGNORECASE),
+    )
+
+
+def get_region_markup(markup: bytes, start_pattern, tags_pattern) -> bytes:
+    """Raw markup of the first element start_pattern matches, found by
+    counting the openings and closings of its tag rather than parsing."""
+    start = start_pattern.search(markup)
+    if not start:
+        return b""
+
+    depth = 0
+    for match in tags_pattern.finditer(markup, start.start()):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return markup[start.start() : match.end()]
+
+    return markup[start.start() :]
+
+
+film_region_patterns = [get_region_patterns(*region) for region in FILM_REGIONS]
+film_strainer = get_region_strainer(FILM_REGIONS)
+listing_strainer = get_region_strainer(LISTING_REGIONS)
+
 
 class Crawler:
-    def crawl_soup(self, url):
+    def __init__(
+        self,
+        concurrency: int = CRAWL_CONCURRENCY,
+        skip_unchanged: bool = SKIP_UNCHANGED_FILMS,
+        restricted_parse: bool = RESTRICTED_PARSE,
+    ):
+        self.concurrency = concurrency
+        self.skip_unchanged = skip_unchanged
+        self.restricted_parse = restricted_parse
+
+    def crawl_soup(self, url, parse_only: SoupStrainer = None):
         logging.info(f"Crawling {url}")
 
         html = helper.download_url(url)
-        soup = BeautifulSoup(html.content, "html.parser")
+        if not self.restricted_parse:
+            parse_only = None
+        soup = helper.make_soup(html.content, parse_only=parse_only)
 
         return soup
 
@@ -68,6 +156,27 @@ class Crawler:
 
         return film_links
 
+    def get_page_hash(
+        self, markup: bytes, title: str, cover_img_src: str, post_type: str
+    ) -> str:
+        """Hash of everything a film insert is built from: the listing data
+        and the raw description, info and link regions of the film page, so
+        unchanged pages are skipped before they are parsed."""
+        if isinstance(markup, str):
+            markup = markup.encode("utf-8")
+        regions = [
+            get_region_markup(markup, *patterns) for patterns in film_region_patterns
+        ]
+        page_hash = hashlib.sha1()
+        for part in [post_type, title, cover_img_src]:
+            page_hash.update(str(part or "").encode("utf-8"))
+            page_hash.update(b"\0")
+        for region in regions:
+            page_hash.update(region)
+            page_hash.update(b"\0")
+
+        return page_hash.hexdigest()
+
     def crawl_film(
         self,
         href: str,
@@ -75,13 +184,41 @@ class Crawler:
         cover_img_src: str,
         post_type: str = "tvshows",
     ):
-        soup = self.crawl_soup(href)
-        fmain = soup.find("div", class_="fmain")
+        return self.parse_film(
+            self.fetch_film(href), href, title, cover_img_src, post_type
+        )
+
+    def fetch_film(self, href: str) -> bytes:
+        logging.info(f"Crawling {href}")
+
+        return helper.download_url(href).content
+
+    def parse_film(
+        self,
+        markup: bytes,
+        href: str,
+        title: str,
+        cover_img_src: str,
+        post_type: str = "tvshows",
+        known_hash: str = None,
+    ):
+        if known_hash is None:
+            known_hash = self.get_known_hash(href)
+
+        page_hash = self.get_page_hash(markup, title, cover_img_src, post_type)
+        if page_hash == known_hash:
+            logging.info(f"Unchanged since last crawl, skipping {href}")
+            return
 
-        description = helper.get_description_from(fmain=fmain)
+        parse_only = film_strainer if self.restricted_parse else None
+        soup = helper.make_soup(markup, parse_only=parse_only)
+
+        page = film_extractor.extract(soup)
+
+        description = film_extractor.get_description(page)
 
         trailer_id = helper.get_trailer_id(soup)
-        extra_info = helper.get_extra_info_from(fmain=fmain)
+        extra_info = film_extractor.get_extra_info(page)
 
         if not title:
             helper.error_log(
@@ -97,6 +234,7 @@ class Crawler:
             "fondo_player": cover_img_src,
             "poster_url": cover_img_src,
             "extra_info": extra_info,
+            "page_hash": page_hash,
         }
 
         # extra_key_file = f"json/{post_type}_extra.json"
@@ -108,52 +246,127 @@ class Crawler:
         # with open(extra_key_file, "w") as f:
         #     f.write(json.dumps(new_extra_key, indent=4, ensure_ascii=False))
 
-        film_links = self.get_film_links(soup, post_type)
+        film_links = film_extractor.get_film_links(page, post_type)
         return [film_data, film_links]
 
-    def crawl_page(
-        self, url: str = CONFIG.FRENCH_STREAM_SERIES, post_type: str = "tvshows"
-    ):
-        soup = self.crawl_soup(url)
+    def get_known_hash(self, href: str) -> str:
+        """Page hash of the last insert of href, if unchanged pages are skipped."""
+        if self.skip_unchanged:
+            return film_hashes.get(href)
+
+    def get_short_data(self, short: BeautifulSoup) -> list:
+        a_element = short.find("a", class_="short-poster")
+
+        href = a_element.get("href")
+        if "http" not in href:
+            href = CONFIG.FRENCH_STREAM_HOMEPAGE + href
+
+        title = a_element.find("div", class_="short-title")
+        title = "" if not title else title.text.replace("\n", "").strip()
+
+        cover_img_src = a_element.find("img")
+        cover_img_src = "" if not cover_img_src else cover_img_src.get("src")
+
+        return [href, title, cover_img_src]
+
+    def crawl_films(self, films: list, post_type: str):
+        """Fetch and parse the film pages of a listing page, up to
+        self.concurrency at a time. Yields one future per film in listing
+        order, so the caller can insert film N while later ones download."""
+        if self.concurrency <= 1:
+            for href, title, cover_img_src in films:
+                crawled_film = Future()
+                try:
+                    crawled_film.set_result(
+                        self.crawl_film(href, title, cover_img_src, post_type)
+                    )
+                except Exception as e:
+                    crawled_film.set_exception(e)
+                yield crawled_film
+            return
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            crawled_films = [
+                executor.submit(self.crawl_film, href, title, cover_img_src, post_type)
+                for href, title, cover_img_src in films
+            ]
+            yield from crawled_films
+
+    def get_films(self, url: str) -> list:
+        """[href, title, cover_img_src] of the films of a listing page, or
+        None when it has none (past the last page)."""
+        try:
+            soup = self.crawl_soup(url, parse_only=listing_strainer)
+        except HTTPError as e:
+            # Past the last page
+            if e.response is not None and e.response.status_code == 404:
+                return
+            raise
         if not soup:
-            return 0
+            return
 
         dle_content = soup.find("div", {"id": "dle-content"})
         if not dle_content:
-            return 0
+            return
 
         shorts = dle_content.find_all("div", class_="short")
         if not shorts:
-            return 0
+            return
 
+        films = []
         for short in shorts:
             try:
-                a_element = short.find("a", class_="short-poster")
+                films.append(self.get_short_data(short))
+            except Exception as e:
+                helper.error_log(f"Failed to get href\n{short}\n{e}", "page.log")
 
-                href = a_element.get("href")
-                if "http" not in href:
-                    href = CONFIG.FRENCH_STREAM_HOMEPAGE + href
+        return films
 
-                title = a_element.find("div", class_="short-title")
-                title = "" if not title else title.text.replace("\n", "").strip()
+    def write_film(self, href: str, film_data: dict, film_links: dict):
+        Dootheme(film_data, film_links).insert_film()
+        # Only remember the page once it is safely in the database
+        film_hashes.set(href, film_data["page_hash"])
 
-                cover_img_src = a_element.find("img")
-                cover_img_src = "" if not cover_img_src else cover_img_src.get("src")
+    def crawl_page(
+        self, url: str = CONFIG.FRENCH_STREAM_SERIES, post_type: str = "tvshows"
+    ):
+        films = self.get_films(url)
+        if films is None:
+            return 0
 
-                film_data, film_links = self.crawl_film(
-                    href=href,
-                    title=title,
-                    cover_img_src=cover_img_src,
-                    post_type=post_type,
-                )
+        for crawled_film, (href, title, cover_img_src) in zip(
+            self.crawl_films(films, post_type), films
+        ):
+            try:
+                crawled = crawled_film.result()
+                if not crawled:
+                    continue
 
-                Dootheme(film_data, film_links).insert_film()
+                self.write_film(href, *crawled)
             except Exception as e:
-                helper.error_log(f"Failed to get href\n{short}\n{e}", "page.log")
+                helper.error_log(f"Failed to crawl film\n{href}\n{e}", "page.log")
 
         return 1
 
 
+def parse_film_page(
+    markup: bytes,
+    href: str,
+    title: str,
+    cover_img_src: str,
+    post_type: str = "tvshows",
+    restricted_parse: bool = RESTRICTED_PARSE,
+    known_hash: str = None,
+):
+    """Crawler.parse_film() over picklable arguments only, for parse worker
+    processes. The caller looks up known_hash, the page is skipped when its
+    hash still matches it."""
+    crawler = Crawler(skip_unchanged=False, restricted_parse=restricted_parse)
+    return crawler.parse_film(
+        markup, href, title, cover_img_src, post_type, known_hash=known_hash
+    )
+
+
 if __name__ == "__main__":
     Crawler().crawl_page(CONFIG.FRENCH_STREAM_SERIES + "/page/111/")
     # Crawler().crawl_page(CONFIG.FRENCH_STREAM_MOVIES, post_type="movies")
@@ -0,0 +1,331 @@
+"""Per-film insert_film() latency as the catalog grows.
+
+    python -m benchmarks.bench_catalog [--backend sqlite|mariadb]
+        [--scales 10000 100000 1000000] [--films 50] [--people N]
+
+A fresh WordPress schema is seeded up to each scale of wp_posts rows. The
+catalog is half synthetic movies and half series (--seasons seasons of
+--episodes episodes each). At each scale the driver reloads the post index
+and term cache, then times Dootheme.insert_film() on:
+- new movies, then movies already posted;
+- new series;
+- new seasons of seeded series, then seasons already posted.
+Seeding writes rows in bulk through the Dootheme row builders
+(generate_post(), generate_*_postmeta(), get_post_terms()), so the rows have
+exactly the shape insert_film() writes without paying for it film by film.
+"""
+import argparse
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from slugify import slugify
+
+from _db import database
+from _post_index import post_index
+from _term_cache import term_cache
+from benchmarks.bench_insert import count_rows, run_phase
+from benchmarks.synthetic import make_movie, make_season
+from benchmarks.wp_db import BENCH_DATABASE, count_queries, use_mariadb, use_sqlite
+from dootheme import Dootheme, doohelper
+from settings import CONFIG
+
+# Films written per transaction while seeding
+SEED_BATCH_FILMS = 100
+
+
+class CatalogSeeder:
+    def __init__(self, seasons: int, episodes: int, people: int):
+        self.seasons = seasons
+        self.episodes = episodes
+        self.people = people
+        self.movies = 0
+        self.series = 0
+        # Next season number of the seeded series the driver added seasons to
+        self.next_seasons = {}
+        # Series the driver added, with a single season
+        self.partial_series = set()
+        # (taxonomy, slug) -> term_taxonomy_id of the terms seeded so far
+        self.terms = {}
+
+    def get_posts(self) -> int:
+        query = f"SELECT COUNT(*) FROM {CONFIG.TABLE_PREFIX}posts"
+        return database.select_with(query)[0][0]
+
+    def load_terms(self):
+        """Pick up the terms insert_film() created since the last seed()."""
+        self.terms = {
+            (taxonomy, slug): term_taxonomy_id
+            for taxonomy, slug, term_taxonomy_id in database.select_with(
+                f"""SELECT tt.taxonomy, t.slug, tt.term_taxonomy_id
+FROM {CONFIG.TABLE_PREFIX}term_taxonomy tt, {CONFIG.TABLE_PREFIX}terms t
+WHERE tt.term_id=t.term_id"""
+            )
+        }
+
+    def seed(self, posts: int):
+        """Add movies and series until wp_posts has `posts` rows."""
+        series_posts = 1 + self.seasons * (1 + self.episodes)
+        missing = posts - self.get_posts()
+        self.load_terms()
+        while missing > 0:
+            films = []
+            while missing > 0 and len(films) < SEED_BATCH_FILMS:
+                if self.movies <= self.series:
+                    films.append(
+                        self.get_dootheme(*make_movie(self.movies, self.people))
+                    )
+                    self.movies += 1
+                    missing -= 1
+                else:
+                    films.append(
+                        [
+                            self.get_dootheme(
+                                *make_season(
+                                    self.series, season, self.episodes, self.people
+                                )
+                            )
+                            for season in range(1, self.seasons + 1)
+                        ]
+                    )
+                    self.series += 1
+                    missing -= series_posts
+
+            with database.transaction():
+                self.write_films(films)
+
+    def get_dootheme(self, film_data: dict, film_links: dict) -> Dootheme:
+        dootheme = Dootheme(film_data, film_links)
+        (
+            dootheme.film["post_title"],
+            dootheme.film["season_number"],
+        ) = doohelper.get_title_and_season_number(dootheme.film["title"])
+        return dootheme
+
+    def write_films(self, films: list):
+        # [dootheme, post_data, what the post is] of every post, in ID order
+        posts = []
+        for film in films:
+            seasons = film if isinstance(film, list) else [film]
+            root = seasons[0]
+            posts.append(
+                [
+                    root,
+                    root.generate_post_data(
+                        root.film["post_title"],
+                        root.film["description"],
+                        root.film["post_type"],
+                    ),
+                    ("root",),
+                ]
+            )
+            if root.film["post_type"] != "tvshows":
+                continue
+
+            for season in seasons:
+                posts.append(
+                    [
+                        season,
+                        season.generate_post_data(
+                            season.get_season_name(),
+                            season.film["description"],
+                            "seasons",
+                        ),
+                        ("season",),
+                    ]
+                )
+                season.film_links = season.format_serie_film_links()
+                for episode_number, episode_name in season.get_episode_names().items():
+                    posts.append(
+                        [
+                            season,
+                            season.generate_post_data(episode_name, "", "episodes"),
+                            ("episode", episode_number),
+                        ]
+                    )
+
+        post_ids = database.insert_many_with_ids(
+            table=f"{CONFIG.TABLE_PREFIX}posts",
+            data=[
+                dootheme.generate_post(post_data) for dootheme, post_data, _ in posts
+            ],
+            id_col="ID",
+            check_col="post_title",
+        )
+
+        postmeta = []
+        post_terms = []
+        root_id = 0
+        for post_id, (dootheme, post_data, kind) in zip(post_ids, posts):
+            if kind[0] == "root":
+                root_id = post_id
+                postmeta.extend(dootheme.generate_film_postmeta(post_id, post_data))
+                if post_data["post_type"] != "tvshows" and dootheme.film_links:
+                    postmeta.extend(dootheme.generate_movie_postmeta(post_id))
+                post_terms.extend(dootheme.get_post_terms(post_id, post_data))
+            elif kind[0] == "season":
+                postmeta.extend(dootheme.generate_season_postmeta(post_id, root_id))
+            else:
+                episode_number = kind[1]
+                postmeta.extend(
+                    dootheme.generate_episode_postmeta(
+                        post_id,
+                        root_id,
+                        episode_number,
+                        dootheme.film_links[episode_number],
+                    )
+                )
+
+        database.insert_many(table=f"{CONFIG.TABLE_PREFIX}postmeta", data=postmeta)
+        self.write_terms(post_terms)
+
+    def write_terms(self, post_terms: list):
+        """Terms and relationships the way insert_terms_batch() creates them."""
+        new_terms = {}
+        for post_id, taxonomy, term in post_terms:
+            key = (taxonomy, slugify(term))
+            if key not in self.terms:
+                new_terms.setdefault(key, term)
+
+        if new_terms:
+            keys = list(new_terms.keys())
+            term_ids = database.insert_many_with_ids(
+                table=f"{CONFIG.TABLE_PREFIX}terms",
+                data=[(new_terms[key], key[1], 0) for key in keys],
+                id_col="term_id",
+                check_col="slug",
+            )
+            term_taxonomy_ids = database.insert_many_with_ids(
+                table=f"{CONFIG.TABLE_PREFIX}term_taxonomy",
+                data=[
+                    (term_id, taxonomy, "", 0, 0)
+                    for term_id, (taxonomy, slug) in zip(term_ids, keys)
+                ],
+                id_col="term_taxonomy_id",
+                check_col="term_id",
+            )
+            self.terms.update(zip(keys, term_taxonomy_ids))
+
+        database.insert_many(
+            table=f"{CONFIG.TABLE_PREFIX}term_relationships",
+            data=list(
+                {
+                    (post_id, self.terms[(taxonomy, slugify(term))], 0)
+                    for post_id, taxonomy, term in post_terms
+                }
+            ),
+            ignore=True,
+        )
+
+    def new_movies(self, count: int) -> list:
+        numbers = range(self.movies, self.movies + count)
+        self.movies += count
+        return [make_movie(number, self.people) for number in numbers]
+
+    def new_series(self, count: int) -> list:
+        numbers = range(self.series, self.series + count)
+        self.series += count
+        # Only their first season exists
+        self.partial_series.update(numbers)
+        return [
+            make_season(number, 1, self.episodes, self.people) for number in numbers
+        ]
+
+    def get_seeded_series(self, count: int, rng: random.Random) -> list:
+        """`count` series with all their seasons posted."""
+        seeded = [n for n in range(self.series) if n not in self.partial_series]
+        return rng.sample(seeded, min(count, len(seeded)))
+
+    def new_seasons(self, count: int, rng: random.Random) -> list:
+        films = []
+        for number in self.get_seeded_series(count, rng):
+            season = self.next_seasons.get(number, self.seasons + 1)
+            self.next_seasons[number] = season + 1
+            films.append(make_season(number, season, self.episodes, self.people))
+
+        return films
+
+    def existing_movies(self, count: int, rng: random.Random) -> list:
+        numbers = rng.sample(range(self.movies), min(count, self.movies))
+        return [make_movie(number, self.people) for number in numbers]
+
+    def existing_seasons(self, count: int, rng: random.Random) -> list:
+        return [
+            make_season(
+                number, rng.randint(1, self.seasons), self.episodes, self.people
+            )
+            for number in self.get_seeded_series(count, rng)
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["sqlite", "mariadb"], default="sqlite")
+    parser.add_argument("--database", default=BENCH_DATABASE)
+    parser.add_argument("--sqlite-path")
+    parser.add_argument(
+        "--scales", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--films", type=int, default=50, help="films timed per phase")
+    parser.add_argument("--seasons", type=int, default=3)
+    parser.add_argument("--episodes", type=int, default=12)
+    # Distinct actors and directors, a tenth of the largest scale by default
+    parser.add_argument("--people", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    if args.backend == "mariadb":
+        use_mariadb(args.database)
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        use_sqlite(args.sqlite_path or Path(tmp_dir.name) / "wordpress.sqlite")
+
+    rng = random.Random(args.seed)
+    people = args.people or max(1000, max(args.scales) // 10)
+    seeder = CatalogSeeder(args.seasons, args.episodes, people)
+    stats = count_queries()
+
+    print(f"Backend: {args.backend}, {args.films} films per phase\n")
+    print(
+        f"{'posts':>9}{'terms':>9}{'load s':>8}  {'phase':<20}"
+        f"{'queries':>9}{'p50 ms':>10}{'p99 ms':>10}"
+    )
+    for scale in sorted(args.scales):
+        start = time.perf_counter()
+        seeder.seed(scale)
+        seed_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        post_index.load()
+        term_cache.preload()
+        load_time = time.perf_counter() - start
+
+        rows = count_rows()
+        phases = [
+            ("movies (new)", seeder.new_movies(args.films)),
+            ("movies (existing)", seeder.existing_movies(args.films, rng)),
+            ("series (new)", seeder.new_series(args.films)),
+            ("seasons (new)", seeder.new_seasons(args.films, rng)),
+            ("seasons (existing)", seeder.existing_seasons(args.films, rng)),
+        ]
+        for i, (name, films) in enumerate(phase for phase in phases if phase[1]):
+            result = run_phase(name, films, stats)
+            prefix = (
+                f"{rows[f'{CONFIG.TABLE_PREFIX}posts']:>9}"
+                f"{rows[f'{CONFIG.TABLE_PREFIX}terms']:>9}{load_time:>8.2f}"
+                if not i
+                else " " * 26
+            )
+            print(
+                f"{prefix}  {name:<20}{result['queries']:>9.1f}"
+                f"{result['p50']:>10.2f}{result['p99']:>10.2f}"
+            )
+        print(f"{'':>26}  seeded in {seed_time:.1f}s\n")
+
+
+if __name__ == "__main__":
+    main()
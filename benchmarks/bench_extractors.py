@@ -0,0 +1,91 @@
+"""Field extraction time of the helper.get_*_from()/Crawler.get_film_links()
+walks against the compiled single-pass extractor.
+
+    python -m benchmarks.bench_extractors [--repeat 50] [pages ...]
+
+Pages default to the film pages in benchmarks/pages. Both must produce the
+same description, extra info and links, the run fails otherwise.
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from _extractor import film_extractor
+from base import Crawler
+from helper import helper
+
+PAGES_DIR = Path(__file__).parent / "pages"
+
+
+def extract_legacy(soup, post_type: str) -> tuple:
+    fmain = soup.find("div", class_="fmain")
+    return (
+        helper.get_description_from(fmain=fmain),
+        helper.get_extra_info_from(fmain=fmain),
+        Crawler().get_film_links(soup, post_type),
+    )
+
+
+def extract_compiled(soup, post_type: str) -> tuple:
+    page = film_extractor.extract(soup)
+    return (
+        film_extractor.get_description(page),
+        film_extractor.get_extra_info(page),
+        film_extractor.get_film_links(page, post_type),
+    )
+
+
+def time_extract(extract, markup: bytes, post_type: str, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        # The legacy walk detaches the server sub-menus, parse a fresh tree
+        soup = helper.make_soup(markup)
+        start = time.perf_counter()
+        result = extract(soup, post_type)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = args.pages or sorted(
+        page for page in PAGES_DIR.glob("*.html") if not page.name.startswith("listing")
+    )
+
+    print(f"Parser: {helper.html_parser}")
+    print(f"{'page':<24}{'legacy ms':>12}{'compiled ms':>14}{'speedup':>10}")
+    totals = [0, 0]
+    for page in pages:
+        markup = page.read_bytes()
+        post_type = "movies" if page.name.startswith("movie") else "tvshows"
+
+        legacy, legacy_result = time_extract(
+            extract_legacy, markup, post_type, args.repeat
+        )
+        compiled, compiled_result = time_extract(
+            extract_compiled, markup, post_type, args.repeat
+        )
+        if legacy_result != compiled_result:
+            raise SystemExit(f"{page.name}: extractors disagree")
+
+        totals[0] += legacy
+        totals[1] += compiled
+        print(
+            f"{page.name:<24}{legacy * 1000:>12.3f}{compiled * 1000:>14.3f}"
+            f"{legacy / compiled:>9.2f}x"
+        )
+
+    print(
+        f"{'total':<24}{totals[0] * 1000:>12.3f}{totals[1] * 1000:>14.3f}"
+        f"{totals[0] / totals[1]:>9.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Dootheme(film_data, film_links).insert_film() throughput on a fresh database.
+
+    python -m benchmarks.bench_insert [--backend sqlite|mariadb] [--pool-size 0]
+        [--movies 200] [--series 20] [--seasons 3] [--episodes 12]
+
+Synthetic movies and multi-season series are inserted into an empty
+WordPress schema, then inserted again to time the already-posted path. Every
+phase reports films/second, queries and connections per film and p50/p99
+latency. The mariadb backend recreates BENCH_DATABASE (dootheme_bench) on
+the configured server; the sqlite one runs in-process, so its timings only
+compare runs with each other but its query and connection counts match.
+Term and post indexes are loaded before timing starts and logging is off.
+"""
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from _db import database
+from _post_index import post_index
+from _term_cache import term_cache
+from benchmarks.synthetic import make_movie, make_season
+from benchmarks.wp_db import BENCH_DATABASE, count_queries, use_mariadb, use_sqlite
+from dootheme import Dootheme
+from settings import CONFIG
+
+
+def get_percentile(values: list, percentile: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0
+
+    return statistics.quantiles(values, n=100, method="inclusive")[percentile - 1]
+
+
+def run_phase(name: str, films: list, stats) -> dict:
+    latencies = []
+    queries = 0
+    connections = 0
+    start = time.perf_counter()
+    for film_data, film_links in films:
+        stats.reset()
+        film_start = time.perf_counter()
+        Dootheme(film_data, film_links).insert_film()
+        latencies.append(time.perf_counter() - film_start)
+        queries += stats.queries
+        connections += stats.connections
+    elapsed = time.perf_counter() - start
+
+    return {
+        "phase": name,
+        "films": len(films),
+        "films_per_second": len(films) / elapsed if elapsed else 0,
+        "queries": queries / len(films),
+        "connections": connections / len(films),
+        "p50": get_percentile(latencies, 50) * 1000,
+        "p99": get_percentile(latencies, 99) * 1000,
+    }
+
+
+def get_films(args) -> dict:
+    return {
+        "movies": [make_movie(number) for number in range(args.movies)],
+        "seasons": [
+            make_season(number, season, args.episodes)
+            for number in range(args.series)
+            for season in range(1, args.seasons + 1)
+        ],
+    }
+
+
+def count_rows() -> dict:
+    return {
+        table: database.select_with(f"SELECT COUNT(*) FROM {table}")[0][0]
+        for table in CONFIG.INSERT.keys()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["sqlite", "mariadb"], default="sqlite")
+    parser.add_argument("--database", default=BENCH_DATABASE)
+    parser.add_argument("--sqlite-path")
+    parser.add_argument("--pool-size", type=int, default=0)
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--series", type=int, default=20)
+    parser.add_argument("--seasons", type=int, default=3)
+    parser.add_argument("--episodes", type=int, default=12)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    if args.backend == "mariadb":
+        use_mariadb(args.database)
+        if args.pool_size:
+            database.use_pool(args.pool_size)
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        use_sqlite(args.sqlite_path or Path(tmp_dir.name) / "wordpress.sqlite")
+    stats = count_queries()
+
+    post_index.ensure_fresh()
+    term_cache.ensure_loaded()
+
+    films = get_films(args)
+    results = []
+    for attempt in ["new", "existing"]:
+        for kind, kind_films in films.items():
+            if kind_films:
+                results.append(run_phase(f"{kind} ({attempt})", kind_films, stats))
+
+    print(f"Backend: {args.backend}, pool size {args.pool_size}\n")
+    print(
+        f"{'phase':<22}{'films':>7}{'films/s':>10}{'queries':>10}"
+        f"{'conns':>8}{'p50 ms':>10}{'p99 ms':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['phase']:<22}{result['films']:>7}"
+            f"{result['films_per_second']:>10.1f}{result['queries']:>10.1f}"
+            f"{result['connections']:>8.1f}{result['p50']:>10.2f}{result['p99']:>10.2f}"
+        )
+
+    print()
+    for table, rows in count_rows().items():
+        print(f"{table:<28}{rows:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Per-page parse time and tree memory of every installed HTML parser.
+
+    python -m benchmarks.bench_parsers [--repeat 20] [--restricted] [pages ...]
+
+Pages default to benchmarks/pages/*.html. --restricted also measures the
+partial parse the crawler does, keeping only the regions it reads
+(listing_*.html pages use the listing regions, all others the film ones).
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from base import film_strainer, listing_strainer
+from helper import HTML_PARSERS, is_parser_installed
+
+PAGES_DIR = Path(__file__).parent / "pages"
+
+
+def time_parse(markup: bytes, parser: str, repeat: int, parse_only=None) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        BeautifulSoup(markup, parser, parse_only=parse_only)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def measure_tree(markup: bytes, parser: str, parse_only=None) -> tuple:
+    """Memory held by the finished tree and peak memory while parsing."""
+    tracemalloc.start()
+    try:
+        soup = BeautifulSoup(markup, parser, parse_only=parse_only)
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del soup
+
+    return size, peak
+
+
+def get_strainer(page: Path):
+    return listing_strainer if page.name.startswith("listing") else film_strainer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--restricted", action="store_true")
+    args = parser.parse_args()
+
+    pages = args.pages or sorted(PAGES_DIR.glob("*.html"))
+    backends = [name for name in HTML_PARSERS if is_parser_installed(name)]
+    missing = [name for name in HTML_PARSERS if name not in backends]
+    if missing:
+        print(f"Not installed, skipped: {', '.join(missing)}")
+
+    modes = ["full", "restricted"] if args.restricted else ["full"]
+    print(
+        f"{'page':<24}{'backend':<14}{'mode':<12}{'KiB':>8}"
+        f"{'parse ms':>12}{'tree KiB':>12}{'peak KiB':>12}"
+    )
+    totals = {(name, mode): 0 for name in backends for mode in modes}
+    for page in pages:
+        markup = page.read_bytes()
+        for name in backends:
+            for mode in modes:
+                parse_only = get_strainer(page) if mode == "restricted" else None
+                seconds = time_parse(markup, name, args.repeat, parse_only)
+                tree_size, peak = measure_tree(markup, name, parse_only)
+                totals[name, mode] += seconds
+                print(
+                    f"{page.name:<24}{name:<14}{mode:<12}{len(markup) / 1024:>8.1f}"
+                    f"{seconds * 1000:>12.2f}{tree_size / 1024:>12.1f}"
+                    f"{peak / 1024:>12.1f}"
+                )
+
+    print()
+    for (name, mode), seconds in totals.items():
+        print(f"{name:<14}{mode:<12}{seconds * 1000:>10.2f} ms for {len(pages)} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Offline parsing benchmark and golden-output check over benchmarks/pages.
+
+    python -m benchmarks.bench_parsing [--repeat 20] [--update-golden]
+
+Every page listed in benchmarks/pages/manifest.json is parsed the way the
+crawler does. The results are compared with benchmarks/golden/<page>.json,
+and the run fails on any difference; --update-golden rewrites them instead.
+It then reports pages/second, the time spent in each extraction function
+and peak memory per page.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from _extractor import film_extractor
+from base import Crawler, film_strainer, listing_strainer
+from dootheme import doohelper
+from helper import helper
+from settings import CONFIG
+
+PAGES_DIR = Path(__file__).parent / "pages"
+GOLDEN_DIR = Path(__file__).parent / "golden"
+
+
+def load_corpus() -> list:
+    manifest = json.loads((PAGES_DIR / "manifest.json").read_text())
+    return [
+        (name, info, (PAGES_DIR / name).read_bytes())
+        for name, info in sorted(manifest.items())
+    ]
+
+
+def parse_listing(markup: bytes) -> list:
+    soup = helper.make_soup(markup, parse_only=listing_strainer)
+    shorts = soup.find("div", {"id": "dle-content"}).find_all("div", class_="short")
+    return [Crawler().get_short_data(short) for short in shorts]
+
+
+def parse_film(markup: bytes, info: dict) -> list:
+    return Crawler(skip_unchanged=False).parse_film(
+        markup, "", info["title"], info["cover_img_src"], info["post_type"]
+    )
+
+
+def get_episodes(film_links: dict) -> dict:
+    return {
+        episode_title: doohelper.get_episode_title_and_language_and_number(
+            episode_title
+        )
+        for episode_title in film_links
+    }
+
+
+def get_output(info: dict, markup: bytes) -> dict:
+    """What the crawler extracts from a page, in a JSON-comparable form."""
+    if info["kind"] == "listing":
+        # Relative hrefs get the configured homepage, keep goldens portable
+        return {
+            "films": [
+                [href.replace(CONFIG.FRENCH_STREAM_HOMEPAGE, ""), title, cover]
+                for href, title, cover in parse_listing(markup)
+            ]
+        }
+
+    film_data, film_links = parse_film(markup, info)
+    output = {"film_data": film_data, "film_links": film_links}
+    if info["post_type"] == "tvshows":
+        output["episodes"] = get_episodes(film_links)
+    return output
+
+
+def get_legacy_output(info: dict, markup: bytes) -> dict:
+    """The film fields as the helper.get_*_from() walks and
+    Crawler.get_film_links() extract them, they must agree with the goldens."""
+    soup = helper.make_soup(markup)
+    fmain = soup.find("div", class_="fmain")
+    return {
+        "description": helper.get_description_from(fmain=fmain),
+        "extra_info": helper.get_extra_info_from(fmain=fmain),
+        "film_links": Crawler().get_film_links(soup, info["post_type"]),
+    }
+
+
+def check_golden(corpus: list, update: bool) -> int:
+    GOLDEN_DIR.mkdir(exist_ok=True)
+    failures = 0
+    for name, info, markup in corpus:
+        # Round-trip through JSON so tuples and lists compare alike
+        output = json.loads(json.dumps(get_output(info, markup), ensure_ascii=False))
+        golden_path = GOLDEN_DIR / f"{Path(name).stem}.json"
+        if update:
+            golden_path.write_text(
+                json.dumps(output, indent=4, ensure_ascii=False) + "\n"
+            )
+            continue
+
+        if not golden_path.is_file():
+            print(f"MISSING {golden_path.name}, run with --update-golden")
+            failures += 1
+            continue
+
+        golden = json.loads(golden_path.read_text())
+        if output != golden:
+            print(f"CHANGED {name}: output differs from {golden_path.name}")
+            failures += 1
+
+        if info["kind"] == "film":
+            legacy = get_legacy_output(info, markup)
+            expected = {
+                "description": golden["film_data"]["description"],
+                "extra_info": golden["film_data"]["extra_info"],
+                "film_links": golden["film_links"],
+            }
+            if legacy != expected:
+                print(f"CHANGED {name}: legacy extraction differs from the golden")
+                failures += 1
+
+    return failures
+
+
+def time_calls(func, args_list: list, repeat: int) -> float:
+    """Median over `repeat` runs of calling func on every args tuple."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def time_on_fresh_soups(func, markups: list, repeat: int, *args) -> float:
+    """Like time_calls() for functions that modify the tree they are given,
+    each call gets a tree of its own, parsed outside the timing."""
+    timings = []
+    for _ in range(repeat):
+        soups = [helper.make_soup(markup) for markup in markups]
+        start = time.perf_counter()
+        for soup in soups:
+            func(soup, *args)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def get_peak_memory(func, *args) -> int:
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def report_timings(corpus: list, repeat: int):
+    listings = [markup for name, info, markup in corpus if info["kind"] == "listing"]
+    films = [(markup, info) for name, info, markup in corpus if info["kind"] == "film"]
+    movies = [markup for markup, info in films if info["post_type"] == "movies"]
+    series = [markup for markup, info in films if info["post_type"] == "tvshows"]
+    fmains = [
+        (helper.make_soup(markup).find("div", class_="fmain"),)
+        for markup, info in films
+    ]
+    shorts = [
+        (short,)
+        for markup in listings
+        for short in helper.make_soup(markup, parse_only=listing_strainer)
+        .find("div", {"id": "dle-content"})
+        .find_all("div", class_="short")
+    ]
+    episode_titles = [
+        (episode_title,)
+        for markup, info in films
+        if info["post_type"] == "tvshows"
+        for episode_title in parse_film(markup, info)[1]
+    ]
+    restricted_soups = [
+        (helper.make_soup(markup, parse_only=film_strainer),) for markup, info in films
+    ]
+
+    print(f"Parser: {helper.html_parser}, {repeat} runs, medians\n")
+    print(f"{'stage':<48}{'calls':>7}{'ms':>10}{'per second':>12}")
+    rows = [
+        (
+            "listing page (parse + get_short_data)",
+            len(listings),
+            time_calls(parse_listing, [(m,) for m in listings], repeat),
+        ),
+        (
+            "film page (Crawler.parse_film)",
+            len(films),
+            time_calls(parse_film, films, repeat),
+        ),
+        (
+            "make_soup, whole page",
+            len(films),
+            time_calls(helper.make_soup, [(m,) for m, i in films], repeat),
+        ),
+        (
+            "make_soup, film regions only",
+            len(films),
+            time_calls(
+                lambda m: helper.make_soup(m, parse_only=film_strainer),
+                [(m,) for m, i in films],
+                repeat,
+            ),
+        ),
+        (
+            "Crawler.get_short_data",
+            len(shorts),
+            time_calls(Crawler().get_short_data, shorts, repeat),
+        ),
+        (
+            "helper.get_description_from",
+            len(fmains),
+            time_calls(helper.get_description_from, fmains, repeat),
+        ),
+        (
+            "helper.get_extra_info_from",
+            len(fmains),
+            time_calls(helper.get_extra_info_from, fmains, repeat),
+        ),
+        (
+            "Crawler.get_film_links (movies)",
+            len(movies),
+            time_on_fresh_soups(Crawler().get_film_links, movies, repeat, "movies"),
+        ),
+        (
+            "Crawler.get_film_links (tvshows)",
+            len(series),
+            time_on_fresh_soups(Crawler().get_film_links, series, repeat, "tvshows"),
+        ),
+        (
+            "film_extractor.extract",
+            len(restricted_soups),
+            time_calls(film_extractor.extract, restricted_soups, repeat),
+        ),
+        (
+            "get_episode_title_and_language_and_number",
+            len(episode_titles),
+            time_calls(
+                doohelper.get_episode_title_and_language_and_number,
+                episode_titles,
+                repeat,
+            ),
+        ),
+    ]
+    for stage, calls, seconds in rows:
+        rate = f"{calls / seconds:>12.0f}" if seconds else f"{'-':>12}"
+        print(f"{stage:<48}{calls:>7}{seconds * 1000:>10.3f}{rate}")
+
+    print(f"\n{'page':<24}{'KiB':>8}{'peak KiB':>12}")
+    for name, info, markup in corpus:
+        if info["kind"] == "listing":
+            peak = get_peak_memory(parse_listing, markup)
+        else:
+            peak = get_peak_memory(parse_film, markup, info)
+        print(f"{name:<24}{len(markup) / 1024:>8.1f}{peak / 1024:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--update-golden", action="store_true")
+    parser.add_argument("--check-only", action="store_true")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    failures = check_golden(corpus, args.update_golden)
+    if args.update_golden:
+        print(f"Golden outputs of {len(corpus)} pages written to {GOLDEN_DIR}")
+        return
+    if failures:
+        sys.exit(f"{failures} golden check(s) failed")
+    print(f"Golden outputs match for {len(corpus)} pages\n")
+
+    if not args.check_only:
+        report_timings(corpus, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
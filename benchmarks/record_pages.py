@@ -0,0 +1,50 @@
+"""Record a live listing page and some of its films into benchmarks/pages.
+
+    python -m benchmarks.record_pages URL movies|tvshows [--films 2] [--prefix NAME]
+
+Pages are saved as served and added to manifest.json. Run
+`python -m benchmarks.bench_parsing --update-golden` afterwards and review
+the new golden outputs before committing them.
+"""
+import argparse
+import json
+from pathlib import Path
+
+from base import Crawler
+from helper import helper
+
+PAGES_DIR = Path(__file__).parent / "pages"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("post_type", choices=["movies", "tvshows"])
+    parser.add_argument("--films", type=int, default=2)
+    parser.add_argument("--prefix", default="recorded")
+    args = parser.parse_args()
+
+    manifest_path = PAGES_DIR / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+
+    listing_name = f"{args.prefix}_listing_{args.post_type}.html"
+    (PAGES_DIR / listing_name).write_bytes(helper.download_url(args.url).content)
+    manifest[listing_name] = {"kind": "listing", "post_type": args.post_type}
+
+    films = Crawler().get_films(args.url) or []
+    for i, (href, title, cover_img_src) in enumerate(films[: args.films], 1):
+        name = f"{args.prefix}_{args.post_type}_{i}.html"
+        (PAGES_DIR / name).write_bytes(helper.download_url(href).content)
+        manifest[name] = {
+            "kind": "film",
+            "post_type": args.post_type,
+            "title": title,
+            "cover_img_src": cover_img_src,
+        }
+        print(f"Recorded {title} as {name}")
+
+    manifest_path.write_text(json.dumps(manifest, indent=4, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Synthetic films in the shape Crawler.parse_film() returns them.
+
+Film numbers map to fixed titles, terms and links, so the same number always
+gives the same film and inserting it again exercises the duplicate paths.
+"""
+import random
+
+GENRES = [
+    "Action",
+    "Animation",
+    "Aventure",
+    "Biopic",
+    "Comédie",
+    "Drame",
+    "Documentaire",
+    "Famille",
+    "Fantastique",
+    "Guerre",
+    "Historique",
+    "Horreur",
+    "Musical",
+    "Policier",
+    "Romance",
+    "Science Fiction",
+    "Thriller",
+    "Western",
+]
+SERVERS = ["Uqload", "Voe", "Dood", "Netu", "Vidoza"]
+LANGUAGES = ["VF", "VOSTFR"]
+# Distinct actors and directors films draw from by default, so terms get reused
+PEOPLE = 20_000
+WORDS = "un homme doit fuir la ville et découvre le secret de sa famille".split()
+
+
+def get_rng(kind: str, number: int) -> random.Random:
+    return random.Random(f"{kind}-{number}")
+
+
+def get_person(rng: random.Random, people: int) -> str:
+    return f"Personne {rng.randrange(people)}"
+
+
+def get_link(rng: random.Random, server: str) -> str:
+    return f"https://{server.lower()}.example/e/{rng.getrandbits(40):010x}"
+
+
+def make_film_data(
+    rng: random.Random, title: str, post_type: str, people: int = PEOPLE
+) -> dict:
+    cover = f"https://img.example/posters/{rng.getrandbits(32):08x}.jpg"
+    extra_info = {
+        "Genre": ", ".join(rng.sample(GENRES, rng.randint(1, 3))),
+        "Date de sortie": str(rng.randint(1970, 2024)),
+    }
+    cast = ", ".join(get_person(rng, people) for _ in range(rng.randint(2, 6)))
+    if post_type == "movies":
+        extra_info["Réalisateur"] = get_person(rng, people)
+        extra_info["Acteurs"] = cast
+        extra_info["Qualité"] = "HD"
+    else:
+        extra_info["Réalisé par"] = get_person(rng, people)
+        extra_info["Avec"] = cast
+
+    return {
+        "title": title,
+        "description": " ".join(rng.choice(WORDS) for _ in range(60)),
+        "post_type": post_type,
+        "trailer_id": "",
+        "fondo_player": cover,
+        "poster_url": cover,
+        "extra_info": extra_info,
+    }
+
+
+def make_movie(number: int, people: int = PEOPLE) -> tuple:
+    """(film_data, film_links) of synthetic movie `number`."""
+    rng = get_rng("movie", number)
+    film_data = make_film_data(rng, f"Film Synthétique {number}", "movies", people)
+    film_links = {
+        server: {
+            language: get_link(rng, server)
+            for language in rng.sample(LANGUAGES, rng.randint(1, len(LANGUAGES)))
+        }
+        for server in rng.sample(SERVERS, rng.randint(2, len(SERVERS)))
+    }
+
+    return film_data, film_links
+
+
+def make_season(number: int, season: int, episodes: int, people: int = PEOPLE) -> tuple:
+    """(film_data, film_links) of season `season` of synthetic series
+    `number`, with `episodes` episodes in VF and most of them in VOSTFR."""
+    rng = get_rng("series", number)
+    film_data = make_film_data(
+        rng, f"Série Synthétique {number} - Saison {season}", "tvshows", people
+    )
+
+    rng = get_rng(f"series-{number}-season", season)
+    servers = rng.sample(SERVERS, 3)
+    film_links = {}
+    for language in LANGUAGES:
+        for episode in range(1, episodes + 1):
+            if language != "VF" and rng.random() < 0.2:
+                continue
+            film_links[f"Épisode {episode} en {language}"] = {
+                server: get_link(rng, server) for server in servers
+            }
+
+    return film_data, film_links
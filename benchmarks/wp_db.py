@@ -0,0 +1,340 @@
+"""Fresh WordPress databases for the write benchmarks, and query counting.
+
+use_mariadb() (re)creates a scratch database on the configured server,
+use_sqlite() an in-process SQLite file standing in for it. Both create the
+wp_posts/postmeta/terms/termmeta/term_taxonomy/term_relationships tables
+with the columns and indexes WordPress creates, and point `database` at
+them. count_queries() wraps its connections to count what goes through.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+
+import mysql.connector
+
+from _db import database
+from settings import CONFIG
+
+BENCH_DATABASE = getattr(CONFIG, "BENCH_DATABASE", "dootheme_bench")
+
+# The tables Dootheme writes, as WordPress creates them. {p} is the prefix.
+MARIADB_SCHEMA = [
+    """CREATE TABLE {p}posts (
+ID bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+post_author bigint(20) unsigned NOT NULL DEFAULT 0,
+post_date datetime NOT NULL DEFAULT '0000-00-00 00:00:00',
+post_date_gmt datetime NOT NULL DEFAULT '0000-00-00 00:00:00',
+post_content longtext NOT NULL,
+post_title text NOT NULL,
+post_excerpt text NOT NULL,
+post_status varchar(20) NOT NULL DEFAULT 'publish',
+comment_status varchar(20) NOT NULL DEFAULT 'open',
+ping_status varchar(20) NOT NULL DEFAULT 'open',
+post_password varchar(255) NOT NULL DEFAULT '',
+post_name varchar(200) NOT NULL DEFAULT '',
+to_ping text NOT NULL,
+pinged text NOT NULL,
+post_modified datetime NOT NULL DEFAULT '0000-00-00 00:00:00',
+post_modified_gmt datetime NOT NULL DEFAULT '0000-00-00 00:00:00',
+post_content_filtered longtext NOT NULL,
+post_parent bigint(20) unsigned NOT NULL DEFAULT 0,
+guid varchar(255) NOT NULL DEFAULT '',
+menu_order int(11) NOT NULL DEFAULT 0,
+post_type varchar(20) NOT NULL DEFAULT 'post',
+post_mime_type varchar(100) NOT NULL DEFAULT '',
+comment_count bigint(20) NOT NULL DEFAULT 0,
+PRIMARY KEY (ID),
+KEY post_name (post_name(191)),
+KEY type_status_date (post_type, post_status, post_date, ID),
+KEY post_parent (post_parent),
+KEY post_author (post_author)
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci""",
+    """CREATE TABLE {p}postmeta (
+meta_id bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+post_id bigint(20) unsigned NOT NULL DEFAULT 0,
+meta_key varchar(255) DEFAULT NULL,
+meta_value longtext,
+PRIMARY KEY (meta_id),
+KEY post_id (post_id),
+KEY meta_key (meta_key(191))
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci""",
+    """CREATE TABLE {p}terms (
+term_id bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+name varchar(200) NOT NULL DEFAULT '',
+slug varchar(200) NOT NULL DEFAULT '',
+term_group bigint(10) NOT NULL DEFAULT 0,
+PRIMARY KEY (term_id),
+KEY slug (slug(191)),
+KEY name (name(191))
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci""",
+    """CREATE TABLE {p}termmeta (
+meta_id bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+term_id bigint(20) unsigned NOT NULL DEFAULT 0,
+meta_key varchar(255) DEFAULT NULL,
+meta_value longtext,
+PRIMARY KEY (meta_id),
+KEY term_id (term_id),
+KEY meta_key (meta_key(191))
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci""",
+    """CREATE TABLE {p}term_taxonomy (
+term_taxonomy_id bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+term_id bigint(20) unsigned NOT NULL DEFAULT 0,
+taxonomy varchar(32) NOT NULL DEFAULT '',
+description longtext NOT NULL,
+parent bigint(20) unsigned NOT NULL DEFAULT 0,
+count bigint(20) NOT NULL DEFAULT 0,
+PRIMARY KEY (term_taxonomy_id),
+UNIQUE KEY term_id_taxonomy (term_id, taxonomy),
+KEY taxonomy (taxonomy)
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci""",
+    """CREATE TABLE {p}term_relationships (
+object_id bigint(20) unsigned NOT NULL DEFAULT 0,
+term_taxonomy_id bigint(20) unsigned NOT NULL DEFAULT 0,
+term_order int(11) NOT NULL DEFAULT 0,
+PRIMARY KEY (object_id, term_taxonomy_id),
+KEY term_taxonomy_id (term_taxonomy_id)
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci""",
+]
+
+# Same tables and indexes. NOCASE stands in for the *_ci collations.
+SQLITE_SCHEMA = """
+CREATE TABLE {p}posts (
+ID INTEGER PRIMARY KEY AUTOINCREMENT,
+post_author INTEGER NOT NULL DEFAULT 0,
+post_date TEXT NOT NULL DEFAULT '',
+post_date_gmt TEXT NOT NULL DEFAULT '',
+post_content TEXT NOT NULL,
+post_title TEXT NOT NULL COLLATE NOCASE,
+post_excerpt TEXT NOT NULL,
+post_status TEXT NOT NULL DEFAULT 'publish',
+comment_status TEXT NOT NULL DEFAULT 'open',
+ping_status TEXT NOT NULL DEFAULT 'open',
+post_password TEXT NOT NULL DEFAULT '',
+post_name TEXT NOT NULL DEFAULT '',
+to_ping TEXT NOT NULL,
+pinged TEXT NOT NULL,
+post_modified TEXT NOT NULL DEFAULT '',
+post_modified_gmt TEXT NOT NULL DEFAULT '',
+post_content_filtered TEXT NOT NULL,
+post_parent INTEGER NOT NULL DEFAULT 0,
+guid TEXT NOT NULL DEFAULT '',
+menu_order INTEGER NOT NULL DEFAULT 0,
+post_type TEXT NOT NULL DEFAULT 'post',
+post_mime_type TEXT NOT NULL DEFAULT '',
+comment_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX {p}posts_post_name ON {p}posts (post_name);
+CREATE INDEX {p}posts_type_status_date
+ON {p}posts (post_type, post_status, post_date, ID);
+CREATE INDEX {p}posts_post_parent ON {p}posts (post_parent);
+CREATE INDEX {p}posts_post_author ON {p}posts (post_author);
+CREATE TABLE {p}postmeta (
+meta_id INTEGER PRIMARY KEY AUTOINCREMENT,
+post_id INTEGER NOT NULL DEFAULT 0,
+meta_key TEXT DEFAULT NULL,
+meta_value TEXT
+);
+CREATE INDEX {p}postmeta_post_id ON {p}postmeta (post_id);
+CREATE INDEX {p}postmeta_meta_key ON {p}postmeta (meta_key);
+CREATE TABLE {p}terms (
+term_id INTEGER PRIMARY KEY AUTOINCREMENT,
+name TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+slug TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+term_group INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX {p}terms_slug ON {p}terms (slug);
+CREATE INDEX {p}terms_name ON {p}terms (name);
+CREATE TABLE {p}termmeta (
+meta_id INTEGER PRIMARY KEY AUTOINCREMENT,
+term_id INTEGER NOT NULL DEFAULT 0,
+meta_key TEXT DEFAULT NULL,
+meta_value TEXT
+);
+CREATE INDEX {p}termmeta_term_id ON {p}termmeta (term_id);
+CREATE INDEX {p}termmeta_meta_key ON {p}termmeta (meta_key);
+CREATE TABLE {p}term_taxonomy (
+term_taxonomy_id INTEGER PRIMARY KEY AUTOINCREMENT,
+term_id INTEGER NOT NULL DEFAULT 0,
+taxonomy TEXT NOT NULL DEFAULT '',
+description TEXT NOT NULL,
+parent INTEGER NOT NULL DEFAULT 0,
+count INTEGER NOT NULL DEFAULT 0,
+UNIQUE (term_id, taxonomy)
+);
+CREATE INDEX {p}term_taxonomy_taxonomy ON {p}term_taxonomy (taxonomy);
+CREATE TABLE {p}term_relationships (
+object_id INTEGER NOT NULL DEFAULT 0,
+term_taxonomy_id INTEGER NOT NULL DEFAULT 0,
+term_order INTEGER NOT NULL DEFAULT 0,
+PRIMARY KEY (object_id, term_taxonomy_id)
+);
+CREATE INDEX {p}term_relationships_term_taxonomy_id
+ON {p}term_relationships (term_taxonomy_id);
+"""
+
+# max_allowed_packet MariaDB defaults to
+SQLITE_MAX_ALLOWED_PACKET = 16 * 1024 * 1024
+
+
+def use_mariadb(name: str = BENCH_DATABASE):
+    """Drop and recreate database `name` on the configured server, and
+    send every `database` call to it."""
+    params = database.get_conn_params()
+    if name == params["database"]:
+        raise ValueError(f"Refusing to recreate the crawler's database {name}")
+
+    server_params = {key: value for key, value in params.items() if key != "database"}
+    conn = mysql.connector.connect(**server_params)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"DROP DATABASE IF EXISTS `{name}`")
+        cur.execute(
+            f"CREATE DATABASE `{name}` "
+            "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_520_ci"
+        )
+        cur.execute(f"USE `{name}`")
+        for statement in MARIADB_SCHEMA:
+            cur.execute(statement.format(p=CONFIG.TABLE_PREFIX))
+    finally:
+        conn.close()
+
+    database.get_conn_params = lambda: {**params, "database": name}
+
+
+class SqliteCursor:
+    """The part of a mysql.connector cursor Database uses, over sqlite3."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.cur = conn.cursor()
+        self.lastrowid = None
+
+    def translate(self, query: str) -> str:
+        query = query.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+        return query.replace(
+            "SELECT @@max_allowed_packet", f"SELECT {SQLITE_MAX_ALLOWED_PACKET}"
+        ).replace(
+            # A single writer, so multi-row INSERT IDs are always consecutive
+            "SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment",
+            "SELECT 1, 1",
+        )
+
+    def execute(self, query: str, data: tuple = ()):
+        self.cur.execute(self.translate(query), tuple(data or ()))
+        self.lastrowid = self.cur.lastrowid
+        if query.lstrip().startswith("INSERT") and self.cur.rowcount > 1:
+            # MariaDB reports the first ID of a multi-row INSERT, SQLite the last
+            self.lastrowid -= self.cur.rowcount - 1
+
+    def executemany(self, query: str, data: list):
+        self.cur.executemany(self.translate(query), [tuple(row) for row in data])
+
+    def fetchall(self) -> list:
+        return self.cur.fetchall()
+
+    def fetchmany(self, size: int) -> list:
+        return self.cur.fetchmany(size)
+
+    def close(self):
+        self.cur.close()
+
+
+class SqliteConnection:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+
+    def cursor(self, **kwargs) -> SqliteCursor:
+        return SqliteCursor(self.conn)
+
+    def start_transaction(self):
+        self.conn.execute("BEGIN")
+
+    def commit(self):
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT")
+
+    def rollback(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+
+    def close(self):
+        self.conn.close()
+
+
+def use_sqlite(path: str):
+    """Create a fresh SQLite WordPress database at `path` and send every
+    `database` call to it, one connection per get_conn() like MariaDB."""
+    path = Path(path)
+    for stale in [path, *path.parent.glob(f"{path.name}-*")]:
+        stale.unlink(missing_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SQLITE_SCHEMA.format(p=CONFIG.TABLE_PREFIX))
+    conn.close()
+
+    database.pool_size = 0
+    database.get_conn = lambda: SqliteConnection(str(path))
+
+
+class QueryStats:
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.queries = 0
+
+    def count(self, connections: int = 0, queries: int = 0):
+        with self.lock:
+            self.connections += connections
+            self.queries += queries
+
+
+class CountingCursor:
+    def __init__(self, cur, stats: QueryStats):
+        self.cur = cur
+        self.stats = stats
+
+    def execute(self, *args, **kwargs):
+        self.stats.count(queries=1)
+        return self.cur.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        # mysql.connector sends an executemany() INSERT as one statement
+        self.stats.count(queries=1)
+        return self.cur.executemany(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.cur, name)
+
+
+class CountingConnection:
+    def __init__(self, conn, stats: QueryStats):
+        self.conn = conn
+        self.stats = stats
+
+    def cursor(self, *args, **kwargs) -> CountingCursor:
+        return CountingCursor(self.conn.cursor(*args, **kwargs), self.stats)
+
+    def __getattr__(self, name: str):
+        return getattr(self.conn, name)
+
+
+def count_queries() -> QueryStats:
+    """Count the connections `database` takes (pool checkouts when pooled)
+    and the statements it runs on them."""
+    stats = QueryStats()
+    get_conn = database.get_conn
+
+    def get_counted_conn():
+        stats.count(connections=1)
+        return CountingConnection(get_conn(), stats)
+
+    database.get_conn = get_counted_conn
+    return stats
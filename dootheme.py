@@ -4,12 +4,14 @@ import re
 from datetime import datetime, timedelta
 from html import escape
 from pathlib import Path
-from time import sleep
 
 from phpserialize import serialize, unserialize
 from slugify import slugify
 
 from _db import database
+from _post_index import post_index
+from _term_cache import term_cache
+from _write_buffer import write_buffer
 from helper import helper
 from settings import CONFIG
 
@@ -181,9 +183,7 @@ class DoothemeHelper:
         ]
 
     def insert_postmeta(self, postmeta_data: list, table: str = "postmeta"):
-        database.insert_into(
-            table=f"{CONFIG.TABLE_PREFIX}{table}", data=postmeta_data, is_bulk=True
-        )
+        write_buffer.add(f"{CONFIG.TABLE_PREFIX}{table}", postmeta_data)
 
     def generate_film_data(
         self,
@@ -359,6 +359,10 @@ class DoothemeHelper:
     def format_condition_str(self, equal_condition: str) -> str:
         return equal_condition.replace("\n", "").strip().lower()
 
+    def get_term_slug(self, term: str, term_slug: str = "") -> str:
+        """Slug a term is looked up, cached and inserted under."""
+        return slugify(term_slug or term)
+
     def insert_terms(
         self,
         post_id: int,
@@ -370,41 +374,138 @@ class DoothemeHelper:
         terms = [term.strip() for term in terms.split(",")] if not is_title else [terms]
         termIds = []
         for term in terms:
-            term_slug = slugify(term_slug) if term_slug else slugify(term)
-            cols = "tt.term_taxonomy_id, tt.term_id"
-            table = (
-                f"{CONFIG.TABLE_PREFIX}term_taxonomy tt, {CONFIG.TABLE_PREFIX}terms t"
-            )
-            condition = f't.slug = "{term_slug}" AND tt.term_id=t.term_id AND tt.taxonomy="{taxonomy}"'
+            # Per term: reusing term_slug gave every term the first one's slug
+            slug = self.get_term_slug(term, term_slug)
+            cached_term = term_cache.get(taxonomy, slug=slug)
+            if cached_term:
+                be_term = [(cached_term[1], cached_term[0])]
+            else:
+                cols = "tt.term_taxonomy_id, tt.term_id"
+                table = f"{CONFIG.TABLE_PREFIX}term_taxonomy tt, {CONFIG.TABLE_PREFIX}terms t"
+                condition = f't.slug = "{slug}" AND tt.term_id=t.term_id AND tt.taxonomy="{taxonomy}"'
 
-            be_term = database.select_all_from(
-                table=table, condition=condition, cols=cols
-            )
+                be_term = database.select_all_from(
+                    table=table, condition=condition, cols=cols
+                )
             if not be_term:
                 term_id = database.insert_into(
                     table=f"{CONFIG.TABLE_PREFIX}terms",
-                    data=(term, term_slug, 0),
+                    data=(term, slug, 0),
                 )
                 term_taxonomy_id = database.insert_into(
                     table=f"{CONFIG.TABLE_PREFIX}term_taxonomy",
                     data=(term_id, taxonomy, "", 0, 0),
                 )
+                term_cache.add(taxonomy, term_id, term_taxonomy_id, slug=slug)
                 termIds = [term_taxonomy_id, True]
             else:
                 term_taxonomy_id = be_term[0][0]
                 term_id = be_term[0][1]
+                if not cached_term:
+                    term_cache.add(taxonomy, term_id, term_taxonomy_id, slug=slug)
                 termIds = [term_taxonomy_id, False]
 
-            try:
-                database.insert_into(
-                    table=f"{CONFIG.TABLE_PREFIX}term_relationships",
-                    data=(post_id, term_taxonomy_id, 0),
-                )
-            except:
-                pass
+            database.insert_many(
+                table=f"{CONFIG.TABLE_PREFIX}term_relationships",
+                data=[(post_id, term_taxonomy_id, 0)],
+                ignore=True,
+            )
 
         return termIds
 
+    def insert_terms_batch(self, post_terms: list) -> dict:
+        """Link (post_id, taxonomy, term) triples of one or more films.
+
+        Terms missing from term_cache are looked up with one slug IN query,
+        the ones still missing are created with multi-row inserts, and every
+        relationship is written with one INSERT IGNORE. Returns
+        {(taxonomy, term): (term_id, term_taxonomy_id, is_new)}."""
+        resolved = {}
+        missing = {}
+        for post_id, taxonomy, term in post_terms:
+            if (taxonomy, term) in resolved or (taxonomy, term) in missing:
+                continue
+
+            cached_term = term_cache.get(taxonomy, name=term)
+            if cached_term:
+                resolved[(taxonomy, term)] = (*cached_term, False)
+            else:
+                missing[(taxonomy, term)] = self.get_term_slug(term)
+
+        if missing:
+            taxonomies = list({taxonomy for taxonomy, term in missing.keys()})
+            slugs = list(set(missing.values()))
+            be_terms = {}
+            for taxonomy, slug, term_id, term_taxonomy_id in database.select_with(
+                f"""SELECT tt.taxonomy, t.slug, t.term_id, tt.term_taxonomy_id
+FROM {CONFIG.TABLE_PREFIX}term_taxonomy tt, {CONFIG.TABLE_PREFIX}terms t
+WHERE tt.term_id=t.term_id
+AND tt.taxonomy IN ({", ".join(["%s"] * len(taxonomies))})
+AND t.slug IN ({", ".join(["%s"] * len(slugs))})
+ORDER BY tt.term_taxonomy_id""",
+                (*taxonomies, *slugs),
+            ):
+                be_terms.setdefault((taxonomy, slug), (term_id, term_taxonomy_id))
+
+            new_terms = {}
+            for (taxonomy, term), slug in missing.items():
+                if (taxonomy, slug) in be_terms:
+                    term_id, term_taxonomy_id = be_terms[(taxonomy, slug)]
+                    resolved[(taxonomy, term)] = (term_id, term_taxonomy_id, False)
+                    term_cache.add(
+                        taxonomy, term_id, term_taxonomy_id, name=term, slug=slug
+                    )
+                else:
+                    new_terms.setdefault((taxonomy, slug), term)
+
+            if new_terms:
+                keys = list(new_terms.keys())
+                term_ids = database.insert_many_with_ids(
+                    table=f"{CONFIG.TABLE_PREFIX}terms",
+                    data=[(new_terms[key], key[1], 0) for key in keys],
+                    id_col="term_id",
+                    check_col="slug",
+                )
+                term_taxonomy_ids = database.insert_many_with_ids(
+                    table=f"{CONFIG.TABLE_PREFIX}term_taxonomy",
+                    data=[
+                        (term_id, taxonomy, "", 0, 0)
+                        for term_id, (taxonomy, slug) in zip(term_ids, keys)
+                    ],
+                    id_col="term_taxonomy_id",
+                    check_col="term_id",
+                )
+
+                for key, term_id, term_taxonomy_id in zip(
+                    keys, term_ids, term_taxonomy_ids
+                ):
+                    be_terms[key] = (term_id, term_taxonomy_id)
+                    term_cache.add(
+                        key[0],
+                        term_id,
+                        term_taxonomy_id,
+                        name=new_terms[key],
+                        slug=key[1],
+                    )
+
+                for (taxonomy, term), slug in missing.items():
+                    if (taxonomy, slug) in new_terms:
+                        term_id, term_taxonomy_id = be_terms[(taxonomy, slug)]
+                        resolved[(taxonomy, term)] = (term_id, term_taxonomy_id, True)
+
+        relationships = {
+            (post_id, resolved[(taxonomy, term)][1], 0)
+            for post_id, taxonomy, term in post_terms
+        }
+        if relationships:
+            database.insert_many(
+                table=f"{CONFIG.TABLE_PREFIX}term_relationships",
+                data=list(relationships),
+                ignore=True,
+            )
+
+        return resolved
+
 
 doohelper = DoothemeHelper()
 
@@ -423,46 +524,18 @@ class Dootheme:
         return equal_condition.replace("\n", "").strip().lower()
 
     def insert_postmeta(self, postmeta_data: list, table: str = "postmeta"):
-        logging.info(f"Inserting postmeta into table {table}")
-        database.insert_into(
-            table=f"{CONFIG.TABLE_PREFIX}{table}", data=postmeta_data, is_bulk=True
-        )
+        logging.info(f"Buffering postmeta for table {table}")
+        write_buffer.add(f"{CONFIG.TABLE_PREFIX}{table}", postmeta_data)
 
     def insert_terms(self, post_id: int, terms: list, taxonomy: str):
+        resolved = doohelper.insert_terms_batch(
+            [(post_id, taxonomy, term) for term in terms]
+        )
+
         termIds = []
         for term in terms:
-            term_name = self.format_condition_str(term)
-            cols = "tt.term_taxonomy_id, tt.term_id"
-            table = (
-                f"{CONFIG.TABLE_PREFIX}term_taxonomy tt, {CONFIG.TABLE_PREFIX}terms t"
-            )
-            condition = f't.name = "{term_name}" AND tt.term_id=t.term_id AND tt.taxonomy="{taxonomy}"'
-
-            be_term = database.select_all_from(
-                table=table, condition=condition, cols=cols
-            )
-            if not be_term:
-                term_id = database.insert_into(
-                    table=f"{CONFIG.TABLE_PREFIX}terms",
-                    data=(term, slugify(term), 0),
-                )
-                termIds = [term_id, True]
-                term_taxonomy_id = database.insert_into(
-                    table=f"{CONFIG.TABLE_PREFIX}term_taxonomy",
-                    data=(term_id, taxonomy, "", 0, 0),
-                )
-            else:
-                term_taxonomy_id = be_term[0][0]
-                term_id = be_term[0][1]
-                termIds = [term_id, False]
-
-            try:
-                database.insert_into(
-                    table=f"{CONFIG.TABLE_PREFIX}term_relationships",
-                    data=(post_id, term_taxonomy_id, 0),
-                )
-            except:
-                pass
+            term_id, term_taxonomy_id, is_new = resolved[(taxonomy, term)]
+            termIds = [term_id, is_new]
 
         return termIds
 
@@ -471,6 +544,9 @@ class Dootheme:
             return
 
         logging.info("Inserting movie players")
+        self.insert_postmeta(self.generate_movie_postmeta(post_id))
+
+    def generate_movie_postmeta(self, post_id: int) -> list:
         movie_links = {}
         for server_name, server_links in self.film_links.items():
             for language, link in server_links.items():
@@ -496,7 +572,7 @@ class Dootheme:
                 (post_id, "Country", self.film["extra_info"]["Country"][0]),
             )
 
-        self.insert_postmeta(postmeta_data)
+        return postmeta_data
 
     def generate_film_data(
         self,
@@ -536,6 +612,18 @@ class Dootheme:
 
         return post_data
 
+    def generate_post_data(self, title: str, description: str, post_type: str) -> dict:
+        """generate_film_data() of a post of this film (root, season or episode)."""
+        return self.generate_film_data(
+            title,
+            description,
+            post_type,
+            self.film["trailer_id"],
+            self.film["fondo_player"],
+            self.film["poster_url"],
+            self.film["extra_info"],
+        )
+
     def get_timeupdate(self) -> datetime:
         timeupdate = datetime.now() - timedelta(hours=7)
 
@@ -572,104 +660,126 @@ class Dootheme:
     def insert_post(self, post_data: dict) -> int:
         data = self.generate_post(post_data)
         post_id = database.insert_into(table=f"{CONFIG.TABLE_PREFIX}posts", data=data)
+        post_index.add(post_data["post_type"], post_data["title"], post_id)
         return post_id
 
+    def insert_posts(self, posts_data: list) -> list:
+        post_ids = database.insert_many_with_ids(
+            table=f"{CONFIG.TABLE_PREFIX}posts",
+            data=[self.generate_post(post_data) for post_data in posts_data],
+            id_col="ID",
+            check_col="post_title",
+        )
+        for post_id, post_data in zip(post_ids, posts_data):
+            post_index.add(post_data["post_type"], post_data["title"], post_id)
+
+        return post_ids
+
+    def find_post(self, post_title: str, post_type: str) -> int:
+        if not post_index.might_exist(post_type, post_title):
+            return 0
+
+        # Movies, tvshows and seasons are indexed by ID, a hit is exact
+        return post_index.get_id(post_type, post_title)
+
     def insert_film_to_database(self, post_data: dict) -> int:
         try:
             post_id = self.insert_post(post_data)
-            timeupdate = self.get_timeupdate()
-
-            postmeta_data = [
-                (
-                    post_id,
-                    "youtube_id",
-                    post_data["youtube_id"],
-                ),
-                (
-                    post_id,
-                    "dt_poster",
-                    post_data["dt_poster"],
-                ),
-                (
-                    post_id,
-                    "dt_backdrop",
-                    post_data["dt_backdrop"],
-                ),
-                (post_id, "original_name", post_data["title"]),
-                (post_id, "_edit_last", "1"),
-                (post_id, "_edit_lock", f"{int(timeupdate.timestamp())}:1"),
-                # _thumbnail_id
-                # (
-                #     post_id,
-                #     "poster_hotlink",
-                #     post_data["poster_url"],
-                # ),
-                # (
-                #     post_id,
-                #     "backdrop_hotlink",
-                #     post_data["fondo_player"],
-                # ),
-            ]
+            self.insert_postmeta(self.generate_film_postmeta(post_id, post_data))
+            doohelper.insert_terms_batch(self.get_post_terms(post_id, post_data))
 
-            tvseries_postmeta_data = [
-                (post_id, "ids", post_id),
-                (post_id, "clgnrt", "1"),
-            ]
-            movie_postmeta_data = []
+            return post_id
+        except Exception as e:
+            helper.error_log(f"Failed to insert film\n{e}")
+            # Let the film's transaction roll back instead of keeping a
+            # post without its meta and terms
+            raise
 
-            if "episode_run_time" in post_data.keys():
-                movie_postmeta_data.append(
-                    (post_id, "runtime", post_data["episode_run_time"]),
-                )
+    def generate_film_postmeta(self, post_id: int, post_data: dict) -> list:
+        timeupdate = self.get_timeupdate()
 
-            for key in ["episode_run_time", "imdbRating"]:
-                if key in post_data.keys():
-                    tvseries_postmeta_data.append(
-                        (
-                            post_id,
-                            key,
-                            post_data[key],
-                        )
-                    )
+        postmeta_data = [
+            (
+                post_id,
+                "youtube_id",
+                post_data["youtube_id"],
+            ),
+            (
+                post_id,
+                "dt_poster",
+                post_data["dt_poster"],
+            ),
+            (
+                post_id,
+                "dt_backdrop",
+                post_data["dt_backdrop"],
+            ),
+            (post_id, "original_name", post_data["title"]),
+            (post_id, "_edit_last", "1"),
+            (post_id, "_edit_lock", f"{int(timeupdate.timestamp())}:1"),
+            # _thumbnail_id
+            # (
+            #     post_id,
+            #     "poster_hotlink",
+            #     post_data["poster_url"],
+            # ),
+            # (
+            #     post_id,
+            #     "backdrop_hotlink",
+            #     post_data["fondo_player"],
+            # ),
+        ]
 
-            if post_data["post_type"] == "tvshows":
-                postmeta_data.extend(tvseries_postmeta_data)
-            else:
-                postmeta_data.extend(movie_postmeta_data)
+        tvseries_postmeta_data = [
+            (post_id, "ids", post_id),
+            (post_id, "clgnrt", "1"),
+        ]
+        movie_postmeta_data = []
 
-            self.insert_postmeta(postmeta_data)
+        if "episode_run_time" in post_data.keys():
+            movie_postmeta_data.append(
+                (post_id, "runtime", post_data["episode_run_time"]),
+            )
 
-            for taxonomy in TAXONOMIES[post_data["post_type"]]:
-                if taxonomy in post_data.keys() and post_data[taxonomy]:
-                    self.insert_terms(
-                        post_id=post_id, terms=post_data[taxonomy], taxonomy=taxonomy
+        for key in ["episode_run_time", "imdbRating"]:
+            if key in post_data.keys():
+                tvseries_postmeta_data.append(
+                    (
+                        post_id,
+                        key,
+                        post_data[key],
                     )
+                )
 
-            return post_id
-        except Exception as e:
-            helper.error_log(f"Failed to insert film\n{e}")
+        if post_data["post_type"] == "tvshows":
+            postmeta_data.extend(tvseries_postmeta_data)
+        else:
+            postmeta_data.extend(movie_postmeta_data)
+
+        return postmeta_data
+
+    def get_post_terms(self, post_id: int, post_data: dict) -> list:
+        post_terms = []
+        for taxonomy in TAXONOMIES[post_data["post_type"]]:
+            if taxonomy in post_data.keys() and post_data[taxonomy]:
+                post_terms.extend(
+                    (post_id, taxonomy, term) for term in post_data[taxonomy]
+                )
+        return post_terms
 
     def insert_root_film(self) -> list:
-        condition_post_title = self.film["post_title"].replace("'", "''")
-        condition = f"""post_title = '{condition_post_title}' AND post_type='{self.film["post_type"]}'"""
-        be_post = database.select_all_from(
-            table=f"{CONFIG.TABLE_PREFIX}posts", condition=condition
-        )
-        if not be_post:
+        be_post_id = self.find_post(self.film["post_title"], self.film["post_type"])
+        if not be_post_id:
             logging.info(f'Inserting root film: {self.film["post_title"]}')
-            post_data = self.generate_film_data(
+            post_data = self.generate_post_data(
                 self.film["post_title"],
                 self.film["description"],
                 self.film["post_type"],
-                self.film["trailer_id"],
-                self.film["fondo_player"],
-                self.film["poster_url"],
-                self.film["extra_info"],
             )
 
             return [self.insert_film_to_database(post_data), True]
         else:
-            return [be_post[0][0], False]
+            return [be_post_id, False]
 
     def update_season_number_of_episodes(self, season_term_id, number_of_episodes):
         try:
@@ -740,154 +850,193 @@ class Dootheme:
 
         return new_film_links
 
+    def find_existing_episodes(self, episode_names: list) -> set:
+        """Normalized titles of the given episodes that are already posted,
+        found with one query for the whole season."""
+        candidates = [
+            episode_name
+            for episode_name in episode_names
+            if post_index.might_exist("episodes", episode_name, catch_up=False)
+        ]
+        if len(candidates) < len(episode_names):
+            # One catch-up for all of the season's misses
+            post_index.catch_up()
+            candidates = [
+                episode_name
+                for episode_name in episode_names
+                if post_index.might_exist("episodes", episode_name, catch_up=False)
+            ]
+        if not candidates:
+            return set()
+
+        be_posts = database.select_with(
+            f"""SELECT post_title FROM {CONFIG.TABLE_PREFIX}posts
+WHERE post_type='episodes' AND post_title IN ({", ".join(["%s"] * len(candidates))})""",
+            candidates,
+        )
+        return {post_index.normalize(post_title) for (post_title,) in be_posts}
+
+    def get_episode_names(self) -> dict:
+        """Episode number -> post title, of the formatted film_links."""
+        return {
+            episode_number: self.film["post_title"]
+            + f': {self.film["season_number"]}x{episode_number}'
+            for episode_number in self.film_links.keys()
+        }
+
     def insert_episodes(self, post_id: int, season_id: int):
         self.film_links = self.format_serie_film_links()
 
         # self.update_season_number_of_episodes(season_id, lenEpisodes)
 
+        episode_names = self.get_episode_names()
+        be_episode_names = self.find_existing_episodes(list(episode_names.values()))
+
+        new_episodes = []
         for episode_number, episode in self.film_links.items():
-            episode_title = episode["title"]
+            episode_name = episode_names[episode_number]
+            if post_index.normalize(episode_name) not in be_episode_names:
+                logging.info(f"Inserting episodes: {episode_name}")
+                post_data = self.generate_post_data(episode_name, "", "episodes")
+                new_episodes.append((episode_number, episode, post_data))
 
-            episode_name = (
-                self.film["post_title"]
-                + f': {self.film["season_number"]}x{episode_number}'
-            )
-            condition_post_title = episode_name.replace("'", "''")
-            condition = (
-                f"""post_title = '{condition_post_title}' AND post_type='episodes'"""
-            )
-            be_post = database.select_all_from(
-                table=f"{CONFIG.TABLE_PREFIX}posts", condition=condition
+        if not new_episodes:
+            return
+
+        # All new episodes of the season go in with one multi-row INSERT, and
+        # all of their postmeta with another
+        episode_ids = self.insert_posts(
+            [post_data for episode_number, episode, post_data in new_episodes]
+        )
+
+        episodes_postmeta = []
+        for episode_id, (episode_number, episode, post_data) in zip(
+            episode_ids, new_episodes
+        ):
+            episodes_postmeta.extend(
+                self.generate_episode_postmeta(
+                    episode_id, post_id, episode_number, episode
+                )
             )
-            if not be_post:
-                logging.info(f"Inserting episodes: {episode_name}")
-                post_data = self.generate_film_data(
-                    episode_name,
-                    "",
-                    "episodes",
-                    self.film["trailer_id"],
-                    self.film["fondo_player"],
+
+        self.insert_postmeta(episodes_postmeta)
+
+    def generate_episode_postmeta(
+        self, episode_id: int, post_id: int, episode_number: str, episode: dict
+    ) -> list:
+        episode_title = episode["title"]
+        episode_postmeta = [
+            (
+                episode_id,
+                "temporada",
+                self.film["season_number"],
+            ),
+            (
+                episode_id,
+                "episodio",
+                episode_number,
+            ),
+            (
+                episode_id,
+                "serie",
+                self.film["post_title"],
+            ),
+            (
+                episode_id,
+                "episode_name",
+                episode_title,
+            ),
+            (episode_id, "ids", post_id),
+            (episode_id, "clgnrt", "1"),
+            (
+                episode_id,
+                "repeatable_fields",
+                self.generate_repeatable_fields(episode["video_links"]),
+            ),
+            (episode_id, "_edit_last", "1"),
+            (
+                episode_id,
+                "_edit_lock",
+                f"{int(self.get_timeupdate().timestamp())}:1",
+            ),
+        ]
+
+        if EPISODE_COVER:
+            episode_postmeta.append(
+                (
+                    episode_id,
+                    "dt_backdrop",
                     self.film["poster_url"],
-                    self.film["extra_info"],
                 )
+            )
 
-                episode_id = self.insert_post(post_data)
-                episode_postmeta = [
-                    (
-                        episode_id,
-                        "temporada",
-                        self.film["season_number"],
-                    ),
-                    (
-                        episode_id,
-                        "episodio",
-                        episode_number,
-                    ),
-                    (
-                        episode_id,
-                        "serie",
-                        self.film["post_title"],
-                    ),
-                    (
-                        episode_id,
-                        "episode_name",
-                        episode_title,
-                    ),
-                    (episode_id, "ids", post_id),
-                    (episode_id, "clgnrt", "1"),
-                    (
-                        episode_id,
-                        "repeatable_fields",
-                        self.generate_repeatable_fields(episode["video_links"]),
-                    ),
-                    (episode_id, "_edit_last", "1"),
-                    (
-                        episode_id,
-                        "_edit_lock",
-                        f"{int(self.get_timeupdate().timestamp())}:1",
-                    ),
-                ]
-
-                if EPISODE_COVER:
-                    episode_postmeta.append(
-                        (
-                            episode_id,
-                            "dt_backdrop",
-                            self.film["poster_url"],
-                        )
-                    )
+        # if "air_date" in self.film.keys():
+        #     episode_postmeta.append(
+        #         (
+        #             episode_id,
+        #             "air_date",
+        #             self.film["air_date"],
+        #         )
+        #     )
 
-                # if "air_date" in self.film.keys():
-                #     episode_postmeta.append(
-                #         (
-                #             episode_id,
-                #             "air_date",
-                #             self.film["air_date"],
-                #         )
-                #     )
+        return episode_postmeta
 
-                self.insert_postmeta(episode_postmeta)
+    def get_season_name(self) -> str:
+        return self.film["post_title"] + ": Saison " + self.film["season_number"]
+
+    def generate_season_postmeta(self, season_id: int, post_id: int) -> list:
+        season_postmeta = [
+            (
+                season_id,
+                "temporada",
+                self.film["season_number"],
+            ),
+            (
+                season_id,
+                "serie",
+                self.film["post_title"],
+            ),
+            (
+                season_id,
+                "dt_poster",
+                self.film["poster_url"],
+            ),
+            (season_id, "ids", post_id),
+            (season_id, "clgnrt", "1"),
+            (season_id, "_edit_last", "1"),
+            (
+                season_id,
+                "_edit_lock",
+                f"{int(self.get_timeupdate().timestamp())}:1",
+            ),
+        ]
+
+        # if "air_date" in self.film.keys():
+        #     season_postmeta.append(
+        #         (
+        #             season_id,
+        #             "air_date",
+        #             self.film["air_date"],
+        #         )
+        #     )
+
+        return season_postmeta
 
     def insert_season(self, post_id: int):
-        season_name = self.film["post_title"] + ": Saison " + self.film["season_number"]
-        condition_post_title = season_name.replace("'", "''")
-        condition = f"""post_title = '{condition_post_title}' AND post_type='seasons'"""
-        be_post = database.select_all_from(
-            table=f"{CONFIG.TABLE_PREFIX}posts", condition=condition
-        )
-        if not be_post:
+        season_name = self.get_season_name()
+        be_post_id = self.find_post(season_name, "seasons")
+        if not be_post_id:
             logging.info(f"Inserting season: {season_name}")
-            post_data = self.generate_film_data(
-                season_name,
-                self.film["description"],
-                "seasons",
-                self.film["trailer_id"],
-                self.film["fondo_player"],
-                self.film["poster_url"],
-                self.film["extra_info"],
+            post_data = self.generate_post_data(
+                season_name, self.film["description"], "seasons"
             )
 
             season_id = self.insert_post(post_data)
-            season_postmeta = [
-                (
-                    season_id,
-                    "temporada",
-                    self.film["season_number"],
-                ),
-                (
-                    season_id,
-                    "serie",
-                    self.film["post_title"],
-                ),
-                (
-                    season_id,
-                    "dt_poster",
-                    self.film["poster_url"],
-                ),
-                (season_id, "ids", post_id),
-                (season_id, "clgnrt", "1"),
-                (season_id, "_edit_last", "1"),
-                (
-                    season_id,
-                    "_edit_lock",
-                    f"{int(self.get_timeupdate().timestamp())}:1",
-                ),
-            ]
-
-            # if "air_date" in self.film.keys():
-            #     season_postmeta.append(
-            #         (
-            #             season_id,
-            #             "air_date",
-            #             self.film["air_date"],
-            #         )
-            #     )
-
-            self.insert_postmeta(season_postmeta)
+            self.insert_postmeta(self.generate_season_postmeta(season_id, post_id))
 
             return season_id
         else:
-            return be_post[0][0]
+            return be_post_id
 
     def insert_film(self):
         (
@@ -895,12 +1044,14 @@ class Dootheme:
             self.film["season_number"],
         ) = doohelper.get_title_and_season_number(self.film["title"])
 
-        post_id, isNewPostInserted = self.insert_root_film()
-        logging.info("Root film ID: %s", post_id)
+        # One commit per film; a failure leaves no half-inserted series behind
+        with database.transaction():
+            post_id, isNewPostInserted = self.insert_root_film()
+            logging.info("Root film ID: %s", post_id)
 
-        if self.film["post_type"] != "tvshows":
-            if isNewPostInserted:
-                self.insert_movie_details(post_id)
-        else:
-            season_term_id = self.insert_season(post_id)
-            self.insert_episodes(post_id, season_term_id)
+            if self.film["post_type"] != "tvshows":
+                if isNewPostInserted:
+                    self.insert_movie_details(post_id)
+            else:
+                season_term_id = self.insert_season(post_id)
+                self.insert_episodes(post_id, season_term_id)
@@ -1,27 +1,60 @@
 import base64
-import os
-import subprocess
+import logging
 from datetime import datetime, timedelta
 from html import escape
 from pathlib import Path
-from time import sleep
 
-import requests
 import urllib3
 from bs4 import BeautifulSoup
 from phpserialize import serialize
 from slugify import slugify
 
+from _db import database
+from _http import ACCEPT_ENCODING, http_cache, http_client
+from _link_resolver import LinkResolver
+from _write_buffer import write_buffer
 from settings import CONFIG
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# "html.parser" (pure Python, always available), "lxml" (C, much faster) or
+# "fast" for the fastest installed one. html5lib is never used: it is far
+# slower than both and the pages do not need its browser-exact repairs.
+HTML_PARSER = getattr(CONFIG, "HTML_PARSER", "html.parser")
+HTML_PARSERS = ["lxml", "html.parser"]
+
+
+def get_html_parser(name: str = HTML_PARSER) -> str:
+    available = [parser for parser in HTML_PARSERS if is_parser_installed(parser)]
+    if name == "fast":
+        return available[0]
+    if name not in available:
+        logging.warning(f"HTML parser {name} is not installed, using html.parser")
+        return "html.parser"
+
+    return name
+
+
+def is_parser_installed(name: str) -> bool:
+    if name == "html.parser":
+        return True
+
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
 
 class Helper:
+    def __init__(self):
+        self.html_parser = get_html_parser()
+        self.link_resolver = LinkResolver(self.fetch_server_link)
+
     def get_header(self):
         header = {
             "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 14_0_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E150",  # noqa: E501
-            "Accept-Encoding": "gzip, deflate",
+            "Accept-Encoding": ACCEPT_ENCODING,
             # "Cookie": CONFIG.COOKIE,
             "Cache-Control": "max-age=0",
             "Accept-Language": "vi-VN",
@@ -35,8 +68,14 @@ class Helper:
         with open(f"log/{log_file}", "a") as f:
             print(f"{datetime_msg} LOG:  {msg}\n{'-' * 80}", file=f)
 
+    def make_soup(self, markup, parser: str = None, **kwargs) -> BeautifulSoup:
+        return BeautifulSoup(markup, parser or self.html_parser, **kwargs)
+
     def download_url(self, url):
-        return requests.get(url, headers=self.get_header())
+        response = http_cache.get(url, headers=self.get_header())
+        # An error page parsed as a film or listing would be silently empty
+        response.raise_for_status()
+        return response
 
     def format_text(self, text: str) -> str:
         return text.strip("\n").replace('"', "'").strip()
@@ -44,6 +83,9 @@ class Helper:
     def format_slug(self, slug: str) -> str:
         return slug.replace("’", "").replace("'", "")
 
+    # Not called by the crawlers: the film pages serve their player links in
+    # plain hrefs, which film_extractor reads. Kept, with the resolver, for
+    # players only reachable through the ajax controller.
     def get_server_link(
         self,
         data_name: str,
@@ -51,20 +93,23 @@ class Helper:
         data_episode: str,
         id_or_episode: str = "episode",
     ):
-        field_ajaxs_mod = "field_ajax" if id_or_episode == "id" else "field_ajaxs"
-        if Path(CONFIG.GETTED_SERVER_LINKS_FILE).is_file():
-            grep_command = [
-                "grep",
-                f"{data_hash}|{data_name}|{data_episode}",
-                CONFIG.GETTED_SERVER_LINKS_FILE,
-            ]
-            result = subprocess.run(grep_command, capture_output=True, text=True)
+        return self.link_resolver.resolve(
+            data_name, data_hash, data_episode, id_or_episode
+        )
 
-            if result.returncode == 0:
-                getted_line = result.stdout.strip("\n").strip()
-                print("getting from getted links...")
-                return getted_line.split("|")[-1]
+    def get_server_links(self, requests: list) -> list:
+        """get_server_link() for many (data_name, data_hash, data_episode)
+        tuples at once, see LinkResolver.resolve_many()."""
+        return self.link_resolver.resolve_many(requests)
 
+    def fetch_server_link(
+        self,
+        data_name: str,
+        data_hash: str,
+        data_episode: str,
+        id_or_episode: str = "episode",
+    ) -> str:
+        field_ajaxs_mod = "field_ajax" if id_or_episode == "id" else "field_ajaxs"
         cookies = {
             # "PHPSESSID": "81rpgnlkfl6crm9a7mtg28th11",
             "PHPSESSID": "qr9vgmeqknhtgpmcr0hcfkvnln",
@@ -85,19 +130,17 @@ class Helper:
 
         data = f"""-----------------------------1149058786588452436175068339\r\nContent-Disposition: form-data; name="mod"\r\n\r\nx{field_ajaxs_mod}\r\n-----------------------------1149058786588452436175068339\r\nContent-Disposition: form-data; name="name"\r\n\r\n{data_name}\r\n-----------------------------1149058786588452436175068339\r\nContent-Disposition: form-data; name="hash"\r\n\r\n{data_hash}\r\n-----------------------------1149058786588452436175068339\r\nContent-Disposition: form-data; name="{id_or_episode}"\r\n\r\n{data_episode}\r\n-----------------------------1149058786588452436175068339--\r\n"""
 
-        response = requests.post(
+        response = http_client.post(
             "https://cpasmieux.monster/engine/ajax/controller.php",
             cookies=cookies,
             headers=headers,
             data=data,
             verify=False,
         )
+        # Never let link_store keep an error page as the link
+        response.raise_for_status()
 
-        link = response.text
-        cmd = f"""echo "{"|".join([data_hash, data_name, data_episode, link])}" >> {CONFIG.GETTED_SERVER_LINKS_FILE}"""
-        os.system(cmd)
-
-        return link
+        return response.text
 
     def add_https_to(self, url: str) -> str:
         if not url:
@@ -601,22 +644,10 @@ class Helper:
             )
         )
 
-        for row in postmeta_data:
-            database.insert_into(
-                table=f"{CONFIG.TABLE_PREFIX}postmeta",
-                data=row,
-            )
-            sleep(0.01)
-
-        sleep(0.01)
+        self.insert_postmeta(postmeta_data)
 
     def insert_postmeta(self, postmeta_data: list, table: str = "postmeta"):
-        for row in postmeta_data:
-            database.insert_into(
-                table=f"{CONFIG.TABLE_PREFIX}{table}",
-                data=row,
-            )
-            sleep(0.01)
+        write_buffer.add(f"{CONFIG.TABLE_PREFIX}{table}", postmeta_data)
 
     def get_server_from(self, index: int, link: str) -> str:
         try:
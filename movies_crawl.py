@@ -1,25 +1,48 @@
 import logging
 import time
 
+from _db import database
+from _frontier import FRONTIER_MAX_RETRIES, Frontier
+from _pipeline import CrawlPipeline, PipelineError, exit_on_sigterm
 from base import Crawler
 from settings import CONFIG
 
 logging.basicConfig(format="%(asctime)s %(levelname)s:%(message)s", level=logging.INFO)
 
+# Used to be compared against the movies URL, which never matched
+FRENCH_STREAM_MOVIES_LAST_PAGE = getattr(CONFIG, "FRENCH_STREAM_MOVIES_LAST_PAGE", 0)
+
 crawler = Crawler()
+frontier = Frontier("movies")
 
 if __name__ == "__main__":
-    i = 2
-    while True:
-        try:
-            crawled_page = crawler.crawl_page(
-                f"{CONFIG.FRENCH_STREAM_MOVIES}/page/{i}/",
-                post_type="movies",
-            )
-            if not crawled_page and i >= CONFIG.FRENCH_STREAM_MOVIES:
-                i = 2
-            else:
-                i += 1
-        except Exception as e:
-            pass
-        time.sleep(CONFIG.WAIT_BETWEEN_ALL)
+    database.use_pool()
+    exit_on_sigterm()
+    with CrawlPipeline(crawler, frontier=frontier) as pipeline:
+        i = frontier.next_page()
+        failures = 0
+        while True:
+            try:
+                pipeline.retry_films(frontier.take_retries())
+                crawled_page = pipeline.crawl_page(
+                    f"{CONFIG.FRENCH_STREAM_MOVIES}/page/{i}/",
+                    post_type="movies",
+                    page=i,
+                )
+                if not crawled_page and i >= FRENCH_STREAM_MOVIES_LAST_PAGE:
+                    frontier.start_pass()
+                    i = frontier.next_page()
+                else:
+                    i = frontier.next_page(after=i)
+                failures = 0
+            except PipelineError:
+                # A stage died, the pipeline cannot crawl anything more
+                raise
+            except Exception:
+                failures += 1
+                logging.exception(f"Failed to crawl page {i} ({failures} times)")
+                if failures >= FRONTIER_MAX_RETRIES:
+                    # Left undone in this pass, so the next pass retries it
+                    i = frontier.next_page(after=i)
+                    failures = 0
+                time.sleep(CONFIG.WAIT_BETWEEN_ALL)
@@ -1,6 +1,8 @@
 import logging
 import time
 
+from _db import database
+from _pipeline import CrawlPipeline, PipelineError, exit_on_sigterm
 from base import Crawler
 from settings import CONFIG
 
@@ -10,9 +12,15 @@ logging.basicConfig(format="%(asctime)s %(levelname)s:%(message)s", level=loggin
 crawler = Crawler()
 
 if __name__ == "__main__":
-    while True:
-        try:
-            crawler.crawl_page(url=CONFIG.FRENCH_STREAM_MOVIES, post_type="movies")
-        except Exception as e:
-            pass
-        time.sleep(CONFIG.WAIT_BETWEEN_LATEST)
+    database.use_pool()
+    exit_on_sigterm()
+    with CrawlPipeline(crawler) as pipeline:
+        while True:
+            try:
+                pipeline.crawl_page(url=CONFIG.FRENCH_STREAM_MOVIES, post_type="movies")
+            except PipelineError:
+                # A stage died, the pipeline cannot crawl anything more
+                raise
+            except Exception:
+                logging.exception("Failed to crawl the latest movies")
+            time.sleep(CONFIG.WAIT_BETWEEN_LATEST)
@@ -0,0 +1,26 @@
+import sqlite3
+
+import pytest
+
+from _frontier import Frontier
+
+
+def test_failed_pass_start_does_not_wedge_the_frontier(tmp_path):
+    frontier = Frontier("movies", path=str(tmp_path / "state.sqlite3"))
+    frontier.complete_page(2, 30)
+    frontier.execute(
+        "CREATE TRIGGER fail_delete BEFORE DELETE ON frontier_pages "
+        "BEGIN SELECT RAISE(ABORT, 'forced failure'); END"
+    )
+
+    with pytest.raises(sqlite3.IntegrityError):
+        frontier.start_pass()
+    assert frontier.get_pass() == 1
+
+    frontier.execute("DROP TRIGGER fail_delete")
+    frontier.start_pass()
+    assert frontier.get_pass() == 2
+    assert frontier.next_page() == 2
+
+    frontier.fail_film(("https://fs.example/1", "Film", "", "movies"), "timeout")
+    assert [film[0] for film in frontier.take_retries()] == ["https://fs.example/1"]
@@ -0,0 +1,22 @@
+import threading
+import time
+
+import pytest
+
+from _http import CircuitBreaker
+
+
+def test_interrupted_probe_lets_the_next_request_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.01)
+    breaker.record_failure("fs.example")
+    time.sleep(0.02)
+
+    with pytest.raises(KeyboardInterrupt):
+        with breaker.attempt("fs.example"):
+            raise KeyboardInterrupt
+
+    probes = []
+    thread = threading.Thread(target=lambda: probes.append(breaker.wait("fs.example")))
+    thread.start()
+    thread.join(1)
+    assert probes == [True]
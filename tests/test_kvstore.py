@@ -0,0 +1,17 @@
+import pytest
+
+from _kvstore import KVStore
+
+
+def test_failed_write_does_not_wedge_the_store(tmp_path):
+    store = KVStore("film_hashes", str(tmp_path / "state.sqlite3"))
+    store.set("kept", "1")
+
+    # Fails inside the transaction, binding a value sqlite cannot store
+    with pytest.raises(Exception):
+        store.set_many([("first", "2"), ("broken", object())])
+
+    store.set("next", "3")
+    assert store.get("kept") == "1"
+    assert store.get("first") is None
+    assert store.get("next") == "3"